@@ -0,0 +1,218 @@
+'''
+爬虫离线压测：在本地启动替身服务器（standin_server.py），让 scraper.crawl_video_rows（extract_video_info 的爬取部分）
+与 bvid.spider_bvid_http 对它发起请求，统计 requests/sec、请求延迟 p50/p99、每页解析耗时，以及限流/出错的次数
+不访问真实网站；所有文件（状态库、bvid/*.log、错误日志）写在临时目录中
+用法：python benchmark/bench_crawler.py [--pages 500] [--workers 8] [--keywords 4] [--latency-ms 30] [--rate-412 0.01] [--server URL] [--output FILE]
+'''
+import io
+import os
+import sys
+import time
+import json
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bvid
+import state
+import scraper
+from pages import load_fixtures, make_bvid
+from standin_server import StandinServer
+
+
+class Timings():
+    '''
+    包装模块函数，记录每次调用的耗时（毫秒）与抛出的异常
+    '''
+
+    def __init__(self, module, name: str):
+        self.module = module
+        self.name = name
+        self.original = getattr(module, name)
+        self.lock = threading.Lock()
+        self.durations = []
+        self.errors = {}
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return self.original(*args, **kwargs)
+            except Exception as e:
+                with self.lock:
+                    self.errors[str(e)] = self.errors.get(str(e), 0) + 1
+                raise
+            finally:
+                with self.lock:
+                    self.durations.append((time.perf_counter() - start) * 1000)
+
+        setattr(module, name, timed)
+
+    def restore(self):
+        setattr(self.module, self.name, self.original)
+
+    def summary(self) -> dict:
+        values = sorted(self.durations)
+        return {
+            "count": len(values),
+            "mean_ms": round(sum(values) / len(values), 2) if values else None,
+            "p50_ms": percentile(values, 50),
+            "p99_ms": percentile(values, 99),
+            "errors": dict(sorted(self.errors.items(), key=lambda item: -item[1])),
+        }
+
+
+def percentile(values: list, p: float):
+    if not values:
+        return None
+    return round(values[min(len(values) - 1, int(len(values) * p / 100))], 2)
+
+
+def status_delta(before: dict, after: dict) -> dict:
+    return {code: after[code] - before.get(code, 0) for code in after if after[code] - before.get(code, 0)}
+
+
+def bench_video_pages(base: str, ids: list, workers: int, server) -> dict:
+    '''
+    并发爬取视频页：请求延迟取 fetch_page，解析耗时取 parse_video_page
+    '''
+    scraper.video_url_base = base + "/video/"
+    fetch = Timings(scraper, "fetch_page")
+    parse = Timings(scraper, "parse_video_page")
+    before = server.snapshot() if server else {}
+    try:
+        start = time.perf_counter()
+        rows = [row for _, _, row in scraper.crawl_video_rows(ids, workers, ordered=False)]
+        elapsed = time.perf_counter() - start
+    finally:
+        fetch.restore()
+        parse.restore()
+
+    return {
+        "pages": len(ids),
+        "workers": workers,
+        "seconds": round(elapsed, 3),
+        "requests_per_sec": round(len(fetch.durations) / elapsed, 1),
+        "rows_per_sec": round(sum(1 for row in rows if row) / elapsed, 1),
+        "rows": sum(1 for row in rows if row),
+        "request": fetch.summary(),
+        "parse": parse.summary(),
+        "server_status": status_delta(before, server.snapshot()) if server else None,
+    }
+
+
+def bench_search(base: str, keywords: list, workers: int, rate: float, server) -> dict:
+    '''
+    多个关键词并发请求搜索接口（与 crawl_keywords_http 相同，但失败时不回退浏览器）
+    '''
+    bvid.home_url = base + "/"
+    bvid.nav_api = base + "/x/web-interface/nav"
+    bvid.search_api = base + "/x/web-interface/wbi/search/type"
+    session, mixin_key = bvid.create_search_session()
+    limiter = bvid.RateLimiter(rate)
+    search = Timings(bvid, "search_page")
+    before = server.snapshot() if server else {}
+    found, failed = [], []
+
+    def crawl(keyword):
+        try:
+            found.append(bvid.spider_bvid_http(keyword, session, mixin_key, limiter))
+        except (requests.RequestException, IOError, ValueError, KeyError):
+            failed.append(keyword)
+
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            list(executor.map(crawl, keywords))
+        elapsed = time.perf_counter() - start
+    finally:
+        search.restore()
+        session.close()
+
+    return {
+        "keywords": len(keywords),
+        "workers": workers,
+        "rate_limit": rate,
+        "seconds": round(elapsed, 3),
+        "requests_per_sec": round(len(search.durations) / elapsed, 1),
+        "bvids": sum(found),
+        "failed_keywords": len(failed),
+        "request": search.summary(),
+        "server_status": status_delta(before, server.snapshot()) if server else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="爬虫离线压测（本地替身服务器）")
+    parser.add_argument("--pages", type=int, default=500, help="爬取的视频页数")
+    parser.add_argument("--workers", type=int, default=scraper.crawl_workers, help="爬取视频页的线程数")
+    parser.add_argument("--keywords", type=int, default=4, help="搜索的关键词数（每个关键词最多 34 页）")
+    parser.add_argument("--search-workers", type=int, default=bvid.search_workers)
+    parser.add_argument("--search-rate", type=float, default=1000.0, help="搜索请求限速（次/秒），压测时默认几乎不限速")
+    parser.add_argument("--latency-ms", type=float, default=30)
+    parser.add_argument("--jitter-ms", type=float, default=10)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--rate-412", type=float, default=0)
+    parser.add_argument("--rate-429", type=float, default=0)
+    parser.add_argument("--fixtures", action="store_true", help="视频页优先使用 benchmark/fixtures 中保存的真实页面")
+    parser.add_argument("--server", help="改用已启动的替身服务器（如 http://127.0.0.1:8000），此时故障注入参数无效")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="显示爬虫自身的逐页输出")
+    parser.add_argument("--output", help="同时把结果写入该 JSON 文件")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures() if args.fixtures else {}
+    rng = random.Random(args.seed)
+    ids = (list(fixtures) * (args.pages // max(1, len(fixtures)) + 1))[:args.pages] if fixtures \
+        else [make_bvid(rng) for _ in range(args.pages)]
+    keywords = [f"压测关键词{n}" for n in range(args.keywords)]
+
+    server = None
+    if args.server:
+        base = args.server.rstrip("/")
+    else:
+        server = StandinServer(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                               rate_412=args.rate_412, rate_429=args.rate_429, seed=args.seed, fixtures=fixtures).start()
+        base = server.url
+
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="bench_crawler_")
+    os.chdir(workdir)
+    os.makedirs(scraper.log_save_path, exist_ok=True)
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    try:
+        with output:
+            video_pages = bench_video_pages(base, ids, args.workers, server)
+            search = bench_search(base, keywords, args.search_workers, args.search_rate, server)
+    finally:
+        os.chdir(cwd)
+        if state.store is not None:
+            state.store.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+        if server:
+            server.stop()
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "server": args.server or {"latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms, "error_rate": args.error_rate,
+                                  "rate_412": args.rate_412, "rate_429": args.rate_429, "fixtures": len(fixtures)},
+        "video_pages": video_pages,
+        "search": search,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
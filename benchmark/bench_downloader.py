@@ -0,0 +1,143 @@
+'''
+内置下载器离线压测：在本地启动文件替身服务器（range_server.py），让 downloader.download_file 依次下载以下场景，
+校验下载结果与原文件逐字节一致，并统计吞吐量（MB/s）与服务器收到的请求数
+  range            服务器支持 Range，多连接分片下载
+  no_range         服务器忽略 Range，整体下载
+  truncated_whole  整体下载时第一个响应被截断，应重试后成功
+  truncated_range  分片下载时前几个分片被截断，应重试后成功
+  truncated_hidden 整体下载时第一个响应被截断且没有 Content-Length，只能按探测到的文件大小发现，应重试后成功
+  always_truncated 整体下载的响应总被截断，应抛出异常且不生成目标文件
+  resume           第一次下载中途服务器开始返回 503，断点保留；第二次只下载剩余分片
+不访问真实网站；下载的文件写在临时目录中。任一场景不符合预期时退出码为 1
+用法：python benchmark/bench_downloader.py [--size-mb 32] [--chunk-mb 1] [--connections 4] [--latency-ms 0] [--output FILE]
+'''
+import io
+import os
+import sys
+import time
+import json
+import shutil
+import argparse
+import tempfile
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import downloader
+from range_server import RangeServer, make_payload
+
+
+def run_download(server, payload: bytes, dest: str, chunk: int, workers: int) -> dict:
+    '''
+    下载一次并与原文件比较
+    :return: 结果；下载抛出异常时记录在 error 中
+    '''
+    server.reset()
+    session = downloader.create_session(pool_size=workers * 2)
+    result = {}
+    start = time.perf_counter()
+    try:
+        downloader.download_file(session, [server.url], dest, chunk, workers)
+    except (IOError, ValueError) as e:
+        result["error"] = str(e)
+    finally:
+        session.close()
+    elapsed = time.perf_counter() - start
+
+    result["seconds"] = round(elapsed, 3)
+    if "error" not in result:
+        with open(dest, "rb") as f:
+            result["identical"] = f.read() == payload
+        result["mb_per_sec"] = round(len(payload) / 1024 ** 2 / elapsed, 1)
+    result["dest_exists"] = os.path.exists(dest)
+    result["server"] = server.snapshot()
+    return result
+
+
+def scenario(server, payload, workdir, name, chunk, workers, ranged=True, truncate=0, fail_after=None,
+             hide_length=False) -> dict:
+    server.ranged, server.truncate, server.fail_after, server.hide_length = ranged, truncate, fail_after, hide_length
+    return run_download(server, payload, os.path.join(workdir, name + ".m4s"), chunk, workers)
+
+
+def bench_resume(server, payload, workdir, chunk, workers) -> dict:
+    '''
+    第一次下载在成功若干分片后遇到持续的 503 而失败，.part.json 记录已完成的分片；恢复服务后第二次下载只请求剩余分片
+    '''
+    dest = os.path.join(workdir, "resume.m4s")
+    chunks = (len(payload) + chunk - 1) // chunk
+    first = scenario(server, payload, workdir, "resume", chunk, workers, fail_after=chunks // 2)
+    done = chunks
+    if os.path.exists(dest + ".part.json"):
+        with open(dest + ".part.json", "r", encoding="utf-8") as f:
+            done = len(json.load(f)["done"])
+    second = scenario(server, payload, workdir, "resume", chunk, workers)
+    second["chunks"] = chunks
+    second["chunks_done_before"] = done
+    second["ok"] = ("error" in first and not os.path.exists(dest + ".part.json")
+                    and second.get("identical") is True and second["server"]["ranges"] == chunks - done)
+    return {"first": first, "second": second, "ok": second.pop("ok")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="内置下载器离线压测（本地文件服务器）")
+    parser.add_argument("--size-mb", type=float, default=32, help="文件大小（MB）")
+    parser.add_argument("--chunk-mb", type=float, default=1, help="Range 分片大小（MB）")
+    parser.add_argument("--connections", type=int, default=downloader.connections, help="每个文件的并发连接数")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--retries", type=int, default=downloader.retries, help="每个分片/整体下载的重试次数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="显示下载器自身的输出")
+    parser.add_argument("--output", help="同时把结果写入该 JSON 文件")
+    args = parser.parse_args()
+
+    payload = make_payload(int(args.size_mb * 1024 ** 2), args.seed)
+    chunk = max(1, int(args.chunk_mb * 1024 ** 2))
+    workers = args.connections
+    downloader.retries = args.retries
+
+    server = RangeServer(payload, latency_ms=args.latency_ms).start()
+    workdir = tempfile.mkdtemp(prefix="bench_downloader_")
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    results = {}
+    try:
+        with output:
+            results["range"] = scenario(server, payload, workdir, "range", chunk, workers)
+            results["no_range"] = scenario(server, payload, workdir, "no_range", chunk, workers, ranged=False)
+            results["truncated_whole"] = scenario(server, payload, workdir, "truncated_whole", chunk, workers,
+                                                  ranged=False, truncate=1)
+            results["truncated_range"] = scenario(server, payload, workdir, "truncated_range", chunk, workers,
+                                                  truncate=2)
+            results["truncated_hidden"] = scenario(server, payload, workdir, "truncated_hidden", chunk, workers,
+                                                   ranged=False, truncate=1, hide_length=True)
+            results["always_truncated"] = scenario(server, payload, workdir, "always_truncated", chunk, workers,
+                                                   ranged=False, truncate=args.retries, hide_length=True)
+            results["resume"] = bench_resume(server, payload, workdir, chunk, workers)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        server.stop()
+
+    for name, result in results.items():
+        if name == "always_truncated":
+            result["ok"] = "error" in result and not result["dest_exists"]
+        elif name != "resume":
+            result["ok"] = result.get("identical") is True
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "size_mb": args.size_mb,
+        "chunk_mb": args.chunk_mb,
+        "connections": workers,
+        "latency_ms": args.latency_ms,
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    return 0 if all(result["ok"] for result in results.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
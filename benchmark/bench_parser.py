@@ -0,0 +1,65 @@
+'''
+视频页解析微基准：对比 BeautifulSoup 解析与快速解析的 pages/sec，并校验两者结果一致
+用法：python benchmark/bench_parser.py [--fixtures DIR] [--pages N] [--repeat R] [--save]
+'''
+import os
+import sys
+import time
+import json
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scraper
+from pages import FIXTURE_PATH, load_fixtures, synthesize_pages
+
+
+def measure(parse, pages: dict, repeat: int):
+    rows = {}
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for bvid, html in pages.items():
+            rows[bvid] = parse(html, scraper.get_video_url(bvid))
+    elapsed = time.perf_counter() - start
+    return len(pages) * repeat / elapsed, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="视频页解析微基准")
+    parser.add_argument("--fixtures", default=FIXTURE_PATH, help="保存的页面目录（*.html，文件名为 BV号）")
+    parser.add_argument("--pages", type=int, default=200, help="目录为空时合成的页面数")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save", action="store_true", help="把合成页面保存到 fixtures 目录")
+    args = parser.parse_args()
+
+    pages = load_fixtures(args.fixtures)
+    source = args.fixtures
+    if not pages:
+        pages = synthesize_pages(args.pages)
+        source = "synthetic"
+        if args.save:
+            os.makedirs(args.fixtures, exist_ok=True)
+            for bvid, html in pages.items():
+                with open(os.path.join(args.fixtures, bvid + ".html"), "w", encoding="utf-8") as f:
+                    f.write(html)
+
+    avg_kb = sum(len(p.encode("utf-8")) for p in pages.values()) / len(pages) / 1024
+    soup_rate, soup_rows = measure(scraper.parse_video_page_soup, pages, args.repeat)
+    fast_rate, fast_rows = measure(scraper.parse_video_page_fast, pages, args.repeat)
+    mismatched = [bvid for bvid in pages if soup_rows[bvid] != fast_rows[bvid]]
+
+    result = {
+        "source": source,
+        "pages": len(pages),
+        "avg_page_kb": round(avg_kb, 1),
+        "soup_pages_per_sec": round(soup_rate, 1),
+        "fast_pages_per_sec": round(fast_rate, 1),
+        "speedup": round(fast_rate / soup_rate, 2),
+        "mismatched": mismatched,
+    }
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 1 if mismatched else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+'''
+去水印整体基准：在本地生成带已知角标水印的合成视频（720p / 1080p / 4K，背景逐帧平移），依次测量
+generate_watermark_mask（自动定位 + 生成蒙版）、inpaint_image（逐帧修复）与 remove_video_watermark（完整流程，含解码与 ffmpeg 编码）
+输出 frames/sec、峰值内存（RSS）、蒙版与真实水印的 IoU、修复结果与无水印原图的 PSNR，结果为 JSON，便于多次运行之间对比
+每个分辨率在单独的子进程和临时目录中运行（峰值内存互不影响，也不会读写仓库中的 log/、video/）
+用法：python benchmark/bench_watermark.py [--resolutions 720p,1080p,4k] [--frames N] [--engine telea] [--ffmpeg PATH] [--verbose] [--output FILE]
+检查失败分支：python benchmark/bench_watermark.py --resolutions 720p --frames 60 --ffmpeg 不存在的路径，结果中记录 error，退出码为 1
+'''
+import io
+import os
+import sys
+import time
+import json
+import shutil
+import platform
+import argparse
+import tempfile
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import video
+import state
+from synthetic import RESOLUTIONS, synthesize_frames, watermark_box, watermark_mask, write_clip
+
+
+SOURCE_FRAMES = 16   # 合成视频循环使用的不同画面数（同 write_clip）
+
+
+def peak_rss_mb():
+    '''
+    :return: (本进程峰值 RSS, 子进程（ffmpeg）中最大的峰值 RSS)，单位 MB；无法获取时为 None
+    '''
+    if resource is not None:
+        unit = 1 if sys.platform == "darwin" else 1024  # macOS 为字节，Linux 为 KB
+        own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit
+        child = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit
+        return round(own / 1024 ** 2, 1), round(child / 1024 ** 2, 1)
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / 1024 ** 2, 1), None
+    return None, None
+
+
+def mask_iou(mask: numpy.ndarray, truth: numpy.ndarray) -> dict:
+    '''
+    生成的蒙版（含膨胀）与真实水印像素的 IoU，以及真实水印被蒙版覆盖的比例
+    '''
+    if mask is None:
+        return {"iou": 0.0, "coverage": 0.0}
+    predicted, actual = mask > 0, truth > 0
+    union = numpy.logical_or(predicted, actual).sum()
+    overlap = numpy.logical_and(predicted, actual).sum()
+    return {
+        "iou": round(float(overlap / union), 4) if union else 0.0,
+        "coverage": round(float(overlap / actual.sum()), 4) if actual.sum() else 0.0,
+    }
+
+
+def psnr(outputs: list, clean: list, box=None) -> float:
+    '''
+    与无水印原图的平均 PSNR，box=[x, y, w, h] 时只比较该区域
+    '''
+    values = []
+    for i, out in enumerate(outputs):
+        ref = clean[i % len(clean)]
+        if box:
+            x, y, w, h = box
+            out, ref = out[y:y + h, x:x + w], ref[y:y + h, x:x + w]
+        values.append(cv2.PSNR(out, ref))
+    return round(float(numpy.mean(values)), 2) if values else None
+
+
+def read_all_frames(path: str) -> list:
+    capture = cv2.VideoCapture(path)
+    frames = []
+    success, frame = capture.read()
+    while success:
+        frames.append(frame)
+        success, frame = capture.read()
+    capture.release()
+    return frames
+
+
+def bench_resolution(label: str, frame_count: int, engine: str, ffmpeg: str, ffprobe: str, verbose: bool = False) -> dict:
+    '''
+    在子进程中测一个分辨率；工作目录切换到临时目录，video.py 的相对路径（video/、log/）都落在其中
+    去水印过程自身的输出默认丢弃，标准输出只有 JSON 结果
+    '''
+    width, height = RESOLUTIONS[label]
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix=f"bench_watermark_{label}_")
+    os.chdir(workdir)
+    os.makedirs(video.VIDEO_PATH, exist_ok=True)
+    os.makedirs(video.log_save_path, exist_ok=True)
+    if ffmpeg:
+        video.FFMPEG_PATH = ffmpeg
+    if ffprobe:
+        video.FFPROBE_PATH = ffprobe
+
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    with output:
+        try:
+            bvid = f"BV1Bench{width:04d}"  # 文件名需含 BV 号
+            clip = write_clip(os.path.join(video.VIDEO_PATH, f"{bvid}.mp4"), width, height, frame_count)
+            clean = synthesize_frames(width, height, min(frame_count, SOURCE_FRAMES), watermark=False)
+            dirty = synthesize_frames(width, height, min(frame_count, SOURCE_FRAMES))
+            truth = watermark_mask(width, height)
+            box = watermark_box(width, height)
+            result = {"clip": f"synthetic-{label}", "resolution": f"{width}x{height}", "frames": frame_count, "engine": engine}
+
+            # 1. 生成蒙版：首次自动检测水印区域并保存；第二次仍会自动检测，与已保存的同分辨率区域重叠时沿用该区域
+            remover = video.WatermarkRemover(threshold=80, kernel_size=5, engine=engine)
+            start = time.perf_counter()
+            mask = remover.generate_watermark_mask(clip)
+            result["mask_seconds"] = round(time.perf_counter() - start, 3)
+            start = time.perf_counter()
+            remover.generate_watermark_mask(clip)
+            result["mask_seconds_cached"] = round(time.perf_counter() - start, 3)
+            result["mask"] = mask_iou(mask, truth)
+            if mask is None:
+                result["error"] = "无法生成水印遮罩"
+                return result
+
+            # 2. 逐帧修复（内存中的合成帧，不含解码与编码）
+            outputs = []
+            start = time.perf_counter()
+            for i in range(frame_count):
+                out = remover.inpaint_image(dirty[i % len(dirty)].copy(), mask)
+                if i < len(dirty):
+                    outputs.append(out)
+            elapsed = time.perf_counter() - start
+            result["inpaint"] = {
+                "fps": round(frame_count / elapsed, 1),
+                "roi_psnr_db": psnr(outputs, clean, box),
+                "roi_psnr_db_before": psnr(dirty, clean, box),
+            }
+
+            # 3. 完整流程：清空已保存的区域，从自动检测开始，输出编码后的视频
+            os.remove(video.ROI_PROFILE_FILE)
+            remover = video.WatermarkRemover(threshold=80, kernel_size=5, engine=engine)
+            store = state.get_store()
+            store.mark(bvid, "merged")
+            start = time.perf_counter()
+            remover.remove_video_watermark({bvid}, [bvid])
+            elapsed = time.perf_counter() - start
+
+            output_path = os.path.join(video.OUTPUT_PATH, f"{bvid}_no_watermark.mp4")
+            if not store.is_done(bvid, "watermark_removed") or not os.path.exists(output_path):
+                failures = {b: reason for b, _, reason in store.failures("watermark_removed")}
+                result["error"] = failures.get(bvid, "未生成输出视频")
+            else:
+                decoded = read_all_frames(output_path)
+                result["full"] = {
+                    "fps": round(frame_count / elapsed, 1),
+                    "seconds": round(elapsed, 3),
+                    "output_frames": len(decoded),
+                    "psnr_db": psnr(decoded, clean),
+                    "roi_psnr_db": psnr(decoded, clean, box),
+                }
+
+            result["peak_rss_mb"], result["peak_child_rss_mb"] = peak_rss_mb()
+            return result
+
+        finally:
+            os.chdir(cwd)
+            if state.store is not None:
+                state.store.close()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="去水印整体基准（合成视频）")
+    parser.add_argument("--resolutions", default="720p,1080p,4k", help="合成视频的分辨率：" + ",".join(RESOLUTIONS))
+    parser.add_argument("--frames", type=int, default=120, help="每个合成视频的帧数")
+    parser.add_argument("--engine", default=video.INPAINT_ENGINE, help="修复引擎：telea / ns / harmonic")
+    parser.add_argument("--ffmpeg", help="ffmpeg 路径，默认使用 video.py 中的 FFMPEG_PATH")
+    parser.add_argument("--ffprobe", help="ffprobe 路径，默认使用 video.py 中的 FFPROBE_PATH")
+    parser.add_argument("--verbose", action="store_true", help="显示去水印过程自身的输出")
+    parser.add_argument("--output", help="同时把结果写入该 JSON 文件")
+    args = parser.parse_args()
+
+    results = []
+    for name in args.resolutions.split(","):
+        label = name.strip().lower()
+        if label not in RESOLUTIONS:
+            parser.error(f"未知分辨率：{name}")
+        # 每个分辨率一个新进程，峰值内存只反映该分辨率
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            results.append(executor.submit(bench_resolution, label, args.frames, args.engine,
+                                           args.ffmpeg, args.ffprobe, args.verbose).result())
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    return 0 if all("error" not in r for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+'''
+生成结构与 B站视频页 / 搜索页一致的合成页面，供基准测试与本地替身服务器使用
+真实页面可直接保存到 fixtures 目录代替合成页面
+'''
+import os
+import json
+import random
+import html as html_lib
+
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+BV_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+
+def make_bvid(rng: random.Random) -> str:
+    return "BV1" + "".join(rng.choice(BV_ALPHABET) for _ in range(9))
+
+
+def render_video_page(bvid: str, seed: int = 0, related_count: int = 40, filler_kb: int = 150) -> str:
+    '''
+    渲染一个合成视频页
+    :param bvid: BV号
+    :param seed: 随机种子，相同参数生成相同页面
+    :param related_count: 相关推荐数量（撑大 __INITIAL_STATE__）
+    :param filler_kb: 其余 DOM 与脚本的大致体积（KB），接近真实页面大小
+    :return: 页面源码
+    '''
+    rng = random.Random(f"{bvid}-{seed}")
+    aid = rng.randint(10 ** 8, 10 ** 12)
+    mid = rng.randint(10 ** 5, 10 ** 10)
+    duration = rng.randint(10, 3 * 3600)
+    title = f"合成视频{bvid} & <测试>"
+    author = f"UP主{mid % 1000}"
+    tags = [f"标签{rng.randint(0, 500)}" for _ in range(rng.randint(1, 8))]
+    stats = [rng.randint(0, 10 ** 7) for _ in range(6)]
+
+    description = (f"这是视频{bvid}的简介, 视频播放量 {stats[0]}、弹幕量 {stats[1]}、点赞数 {stats[2]}、"
+                   f"投硬币枚数 {stats[3]}、收藏人数 {stats[4]}、转发人数 {stats[5]}, "
+                   f"视频作者 {author}, 作者简介 UP主{mid}的简介 \"你好\", 相关视频：{title}")
+    keywords = ",".join([title] + tags + ["哔哩哔哩", "bilibili", "B站", "弹幕"])
+
+    related = [{
+        "aid": rng.randint(10 ** 8, 10 ** 12),
+        "bvid": make_bvid(rng),
+        "title": f"相关视频{n}",
+        "duration": rng.randint(10, 3600),
+        "owner": {"mid": rng.randint(10 ** 5, 10 ** 10), "name": f"UP主{n}", "face": "https://i0.hdslb.com/bfs/face/x.jpg"},
+        "stat": {"view": rng.randint(0, 10 ** 6), "danmaku": rng.randint(0, 10 ** 4)},
+    } for n in range(related_count)]
+
+    state = {
+        "aid": aid,
+        "bvid": bvid,
+        "p": 1,
+        "videoData": {
+            "bvid": bvid,
+            "aid": aid,
+            "title": title,
+            "desc": f"这是视频{bvid}的简介",
+            "duration": duration,
+            "owner": {"mid": mid, "name": author},
+            "stat": dict(zip(["view", "danmaku", "like", "coin", "favorite", "share"], stats)),
+            "pages": [{"cid": aid + 1, "page": 1, "duration": duration}],
+        },
+        "upData": {"mid": str(mid), "name": author},
+        "related": related,
+    }
+    playinfo = {"code": 0, "data": {"dash": {
+        "video": [{"id": 80, "baseUrl": f"https://upos.example.com/{bvid}-{n}.m4s", "bandwidth": rng.randint(10 ** 5, 10 ** 7)} for n in range(20)],
+        "audio": [{"id": 30280, "baseUrl": f"https://upos.example.com/{bvid}-a.m4s"}],
+    }}}
+
+    filler = []
+    size = 0
+    while size < filler_kb * 1024:
+        block = (f'<div class="bili-video-card" data-v-{rng.randint(0, 10 ** 6):x}>'
+                 f'<a href="//www.bilibili.com/video/{make_bvid(rng)}/" target="_blank">'
+                 f'<img src="//i0.hdslb.com/bfs/archive/{rng.getrandbits(64):x}.jpg" alt="封面">'
+                 f'<span class="title">推荐视频 {rng.random()}</span></a></div>\n')
+        filler.append(block)
+        size += len(block.encode("utf-8"))
+
+    return (
+        '<!DOCTYPE html><html lang="zh-CN"><head><meta charset="UTF-8">'
+        f'<title data-vue-meta="true">{html_lib.escape(title, quote=False)}_哔哩哔哩_bilibili</title>'
+        f'<meta data-vue-meta="true" itemprop="description" name="description" content="{html_lib.escape(description)}">'
+        f'<meta data-vue-meta="true" itemprop="keywords" name="keywords" content="{html_lib.escape(keywords)}">'
+        f'<meta data-vue-meta="true" itemprop="author" name="author" content="{html_lib.escape(author)}">'
+        f'<meta data-vue-meta="true" itemprop="uploadDate" content="2024-0{rng.randint(1, 9)}-1{rng.randint(0, 9)} 1{rng.randint(0, 9)}:00:00">'
+        '<link rel="stylesheet" href="//s1.hdslb.com/bfs/static/player/main.css">'
+        '</head><body><div id="app">'
+        + "".join(filler) +
+        f'</div><script>window.__playinfo__={json.dumps(playinfo, ensure_ascii=False)}</script>'
+        f'<script>window.__INITIAL_STATE__={json.dumps(state, ensure_ascii=False, separators=(",", ":"))};'
+        '(function(){var s;(s=document.currentScript||document.scripts[document.scripts.length-1]).parentNode.removeChild(s);}());'
+        '</script></body></html>'
+    )
+
+
+def load_fixtures(folder: str = FIXTURE_PATH) -> dict:
+    '''
+    读取保存的页面，文件名（去掉扩展名）作为 BV号
+    :return: {BV号: 页面源码}
+    '''
+    pages = {}
+    if not os.path.isdir(folder):
+        return pages
+    for filename in sorted(os.listdir(folder)):
+        if filename.endswith(".html"):
+            with open(os.path.join(folder, filename), "r", encoding="utf-8") as f:
+                pages[filename[:-len(".html")]] = f.read()
+    return pages
+
+
+def synthesize_pages(count: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    return {bvid: render_video_page(bvid, seed) for bvid in (make_bvid(rng) for _ in range(count))}
@@ -0,0 +1,166 @@
+'''
+本地文件替身服务器：提供一个确定内容的二进制文件，供 downloader.py 的分片下载、整体下载、截断重试与断点续传压测使用，不访问真实 CDN
+可配置是否支持 Range、接下来截断多少个响应（只发送一半后断开连接），以及成功多少个分片后开始返回 503
+截断的响应默认声明完整的 Content-Length；--hide-length 时不发送 Content-Length，客户端只能用探测到的文件大小发现截断
+用法：python benchmark/range_server.py [--port 8001] [--size-mb 32] [--no-range] [--truncate 2] [--hide-length] [--fail-after 10] [--latency-ms 0]
+      然后用 downloader.download_file(downloader.create_session(), "http://127.0.0.1:8001/file.m4s", 保存路径) 下载
+'''
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_payload(size: int, seed: int = 0) -> bytes:
+    return random.Random(seed).randbytes(size)
+
+
+class RangeServer():
+    '''
+    在后台线程中运行的文件服务器，url 为文件地址；stats 按 HTTP 状态码统计已发出的响应
+    ranged / truncate / fail_after 可在运行中修改，用于在同一次压测中切换场景
+    '''
+
+    def __init__(self, payload: bytes, host: str = "127.0.0.1", port: int = 0, ranged: bool = True,
+                 truncate: int = 0, fail_after: int = None, latency_ms: float = 0, hide_length: bool = False):
+        self.payload = payload
+        self.ranged = ranged
+        self.truncate = truncate        # 接下来截断的响应数（探测大小的 bytes=0-0 请求不计）
+        self.hide_length = hide_length  # 截断的响应不发送 Content-Length
+        self.fail_after = fail_after    # 再成功发送多少个分片后开始返回 503，None 为不出错
+        self.latency = latency_ms / 1000
+        self.lock = threading.Lock()
+        self.stats = Counter()
+        self.requested_ranges = []      # 收到的 Range 头（不含探测请求）
+        self.bytes_sent = 0
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive，与 CDN 一致
+
+            def do_GET(self):
+                server.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/file.m4s"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {"status": {str(code): count for code, count in sorted(self.stats.items())},
+                    "ranges": len(self.requested_ranges), "bytes_sent": self.bytes_sent}
+
+    def reset(self):
+        with self.lock:
+            self.stats.clear()
+            self.requested_ranges = []
+            self.bytes_sent = 0
+
+    # ---------- 响应 ----------
+    def handle(self, request):
+        if self.latency:
+            time.sleep(self.latency)
+
+        range_header = request.headers.get("Range", "")
+        probe = range_header == "bytes=0-0"
+        start, end = 0, len(self.payload) - 1
+        status = 200
+        if self.ranged and range_header.startswith("bytes="):
+            first, _, last = range_header[len("bytes="):].partition("-")
+            start, end = int(first), min(int(last) if last else end, end)
+            status = 206
+
+        with self.lock:
+            if not probe and range_header:
+                self.requested_ranges.append(range_header)
+            if not probe and self.fail_after is not None:
+                if self.fail_after <= 0:
+                    status = 503
+                else:
+                    self.fail_after -= 1
+            truncated = not probe and status != 503 and self.truncate > 0
+            if truncated:
+                self.truncate -= 1
+
+        if status == 503:
+            return self.send(request, 503, b"503 Service Unavailable", {})
+
+        body = self.payload[start:end + 1]
+        extra = {"Accept-Ranges": "bytes"} if self.ranged else {}
+        if status == 206:
+            extra["Content-Range"] = f"bytes {start}-{end}/{len(self.payload)}"
+        return self.send(request, status, body, extra, sent=len(body) // 2 if truncated else None)
+
+    def send(self, request, status: int, body: bytes, extra_headers: dict, sent: int = None):
+        '''
+        :param sent: 只发送前 sent 字节后断开连接，None 为完整发送
+        '''
+        with self.lock:
+            self.stats[status] += 1
+            self.bytes_sent += len(body) if sent is None else sent
+        request.send_response(status)
+        request.send_header("Content-Type", "application/octet-stream" if status < 400 else "text/plain")
+        if sent is None or not self.hide_length:
+            request.send_header("Content-Length", str(len(body)))
+        for name, value in extra_headers.items():
+            request.send_header(name, value)
+        if sent is not None:
+            request.send_header("Connection", "close")
+            request.close_connection = True
+        request.end_headers()
+        try:
+            request.wfile.write(body if sent is None else body[:sent])
+        except (ConnectionResetError, BrokenPipeError):
+            pass  # 探测大小的请求只读响应头就关闭连接
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地文件替身服务器（Range / 无 Range / 截断）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--size-mb", type=float, default=32, help="文件大小（MB）")
+    parser.add_argument("--no-range", action="store_true", help="忽略 Range 头，总是返回完整文件（200）")
+    parser.add_argument("--truncate", type=int, default=0, help="截断接下来的多少个响应")
+    parser.add_argument("--hide-length", action="store_true", help="截断的响应不发送 Content-Length")
+    parser.add_argument("--fail-after", type=int, help="成功发送多少个响应后开始返回 503")
+    parser.add_argument("--latency-ms", type=float, default=0, help="每个响应的延迟（毫秒）")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = RangeServer(make_payload(int(args.size_mb * 1024 ** 2), args.seed), args.host, args.port,
+                         not args.no_range, args.truncate, args.fail_after, args.latency_ms, args.hide_length)
+    print(f"文件服务器已启动：{server.url}（Ctrl+C 退出）")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(json.dumps(server.snapshot(), ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
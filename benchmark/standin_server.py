@@ -0,0 +1,183 @@
+'''
+本地 B站替身服务器：提供合成（或 fixtures 中保存的）视频页、首页、nav 接口与 WBI 搜索接口，供爬虫压测使用，不访问真实网站
+可配置响应延迟、出错率（HTTP 500）与限流（HTTP 412 / 429）比例
+用法：python benchmark/standin_server.py [--port 8000] [--latency-ms 50] [--jitter-ms 20] [--error-rate 0.01] [--rate-412 0.01] [--rate-429 0.01]
+      然后把 scraper.video_url_base 设为 http://127.0.0.1:8000/video/，bvid.home_url / nav_api / search_api 设为对应地址
+'''
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from collections import Counter, OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from pages import load_fixtures, make_bvid, render_video_page
+
+
+SEARCH_PAGE_SIZE = 20   # 每页搜索结果数（同 B站）
+SEARCH_PAGES = 34       # 每个关键词的结果页数
+
+
+class StandinServer():
+    '''
+    在后台线程中运行的替身服务器，url 为其根地址；stats 按 HTTP 状态码统计已发出的响应
+    '''
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0, jitter_ms: float = 0,
+                 error_rate: float = 0, rate_412: float = 0, rate_429: float = 0, seed: int = 0,
+                 fixtures: dict = None, page_cache_size: int = 256):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.rate_412 = rate_412
+        self.rate_429 = rate_429
+        self.seed = seed
+        self.fixtures = fixtures or {}
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = Counter()
+        self.pages = OrderedDict()  # 渲染好的视频页（LRU），避免渲染耗时计入服务器延迟
+        self.page_cache_size = page_cache_size
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive，与真实站点一致
+
+            def do_GET(self):
+                server.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {str(code): count for code, count in sorted(self.stats.items())}
+
+    # ---------- 响应 ----------
+    def handle(self, request):
+        with self.lock:
+            delay = max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+            roll = self.rng.random()
+        if delay:
+            time.sleep(delay)
+
+        parsed = urlparse(request.path)
+        path = parsed.path.rstrip("/")
+
+        # 故障注入：视频页与搜索接口按比例返回限流或错误（首页与 nav 接口不注入，保证能建立会话）
+        if not (path.startswith("/video/") or path == "/x/web-interface/wbi/search/type"):
+            roll = 1.0
+        if roll < self.rate_412:
+            return self.send(request, 412, b"<html><body>412 Precondition Failed</body></html>", "text/html")
+        if roll < self.rate_412 + self.rate_429:
+            return self.send(request, 429, b"<html><body>429 Too Many Requests</body></html>", "text/html",
+                             {"Retry-After": "1"})
+        if roll < self.rate_412 + self.rate_429 + self.error_rate:
+            return self.send(request, 500, b"<html><body>500 Internal Server Error</body></html>", "text/html")
+
+        if path.startswith("/video/"):
+            return self.send(request, 200, self.video_page(path[len("/video/"):]).encode("utf-8"), "text/html; charset=utf-8")
+        if path == "/x/web-interface/nav":
+            return self.send_json(request, {"code": 0, "data": {"wbi_img": {
+                "img_url": "https://i0.hdslb.com/bfs/wbi/7cd084941338484aae1ad9425b84077c.png",
+                "sub_url": "https://i0.hdslb.com/bfs/wbi/4932caff0ff746eab6f01bf08b70ac45.png"}}})
+        if path == "/x/web-interface/wbi/search/type":
+            query = parse_qs(parsed.query)
+            return self.send_json(request, self.search_result(query.get("keyword", [""])[0],
+                                                              int(query.get("page", ["1"])[0])))
+        if path == "":
+            return self.send(request, 200, b"<html><body>home</body></html>", "text/html",
+                             {"Set-Cookie": "buvid3=standin; Path=/"})
+        return self.send(request, 404, b"not found", "text/plain")
+
+    def video_page(self, bvid: str) -> str:
+        if bvid in self.fixtures:
+            return self.fixtures[bvid]
+        with self.lock:
+            html = self.pages.get(bvid)
+            if html is not None:
+                self.pages.move_to_end(bvid)
+                return html
+        html = render_video_page(bvid, self.seed)
+        with self.lock:
+            self.pages[bvid] = html
+            while len(self.pages) > self.page_cache_size:
+                self.pages.popitem(last=False)
+        return html
+
+    def search_result(self, keyword: str, page: int) -> dict:
+        '''
+        同一关键词、同一页总是返回相同的 BV 号；不同关键词之间有少量重复
+        '''
+        rng = random.Random(f"{keyword}-{page}-{self.seed}")
+        shared = random.Random(f"shared-{page}-{self.seed}")
+        bvids = [make_bvid(rng) for _ in range(SEARCH_PAGE_SIZE - 2)] + [make_bvid(shared) for _ in range(2)]
+        result = [{"type": "video", "bvid": bvid, "title": f"{keyword} 搜索结果 {n}"} for n, bvid in enumerate(bvids)]
+        return {"code": 0, "message": "0", "data": {"page": page, "pagesize": SEARCH_PAGE_SIZE,
+                                                     "numPages": SEARCH_PAGES, "result": result}}
+
+    def send_json(self, request, body: dict):
+        return self.send(request, 200, json.dumps(body, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8")
+
+    def send(self, request, status: int, body: bytes, content_type: str, extra_headers: dict = None):
+        with self.lock:
+            self.stats[status] += 1
+        request.send_response(status)
+        request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(body)))
+        for name, value in (extra_headers or {}).items():
+            request.send_header(name, value)
+        request.end_headers()
+        request.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 B站替身服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency-ms", type=float, default=0, help="每个响应的平均延迟（毫秒）")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="延迟的随机波动范围（毫秒）")
+    parser.add_argument("--error-rate", type=float, default=0, help="返回 HTTP 500 的比例")
+    parser.add_argument("--rate-412", type=float, default=0, help="返回 HTTP 412（风控拦截）的比例")
+    parser.add_argument("--rate-429", type=float, default=0, help="返回 HTTP 429（请求过多）的比例")
+    parser.add_argument("--fixtures", action="store_true", help="优先返回 benchmark/fixtures 中保存的真实页面")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = StandinServer(args.host, args.port, args.latency_ms, args.jitter_ms, args.error_rate,
+                           args.rate_412, args.rate_429, args.seed, load_fixtures() if args.fixtures else None)
+    print(f"替身服务器已启动：{server.url}（Ctrl+C 退出）")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(json.dumps(server.snapshot(), ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
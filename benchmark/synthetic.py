@@ -0,0 +1,89 @@
+'''
+生成带固定角标水印的合成视频帧，供去水印相关的基准测试使用
+水印位置与真实 B站视频一致（右上角），背景逐帧平移，模拟画面运动
+'''
+import cv2
+import numpy
+
+
+RESOLUTIONS = {
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+    "4k": (3840, 2160),
+}
+
+WATERMARK_TEXT = "bilibili"
+
+
+def watermark_box(width: int, height: int) -> list:
+    '''
+    水印所在区域，格式同 WatermarkRemover.select_roi：[x, y, w, h]
+    '''
+    scale = height / 1080
+    w, h = int(260 * scale), int(90 * scale)
+    return [width - w - int(40 * scale), int(30 * scale), w, h]
+
+
+def render_background(width: int, height: int, seed: int = 0) -> numpy.ndarray:
+    '''
+    平滑渐变加模糊噪声的背景，比纯色更接近真实画面；噪声颗粒随分辨率放大（同一画面的不同分辨率）
+    '''
+    rng = numpy.random.default_rng(seed)
+    cell = max(1, round(8 * height / 1080))
+    noise = rng.integers(0, 256, (height // cell + 1, width // cell + 1, 3), dtype=numpy.uint8)
+    background = cv2.resize(noise, (width, height), interpolation=cv2.INTER_CUBIC)
+    ramp = numpy.linspace(0, 60, width, dtype=numpy.float32)[None, :, None]
+    return numpy.clip(background.astype(numpy.float32) * 0.5 + ramp, 0, 255).astype(numpy.uint8)
+
+
+def put_watermark_text(img: numpy.ndarray, color) -> numpy.ndarray:
+    height, width = img.shape[:2]
+    x, y, w, h = watermark_box(width, height)
+    scale = height / 1080
+    cv2.putText(img, WATERMARK_TEXT, (x + int(10 * scale), y + int(62 * scale)),
+                cv2.FONT_HERSHEY_SIMPLEX, 1.6 * scale, color, max(1, int(4 * scale)), cv2.LINE_AA)
+    return img
+
+
+def draw_watermark(frame: numpy.ndarray, alpha: float = 0.85) -> numpy.ndarray:
+    '''
+    在右上角叠加半透明白色文字水印（原地修改）
+    '''
+    overlay = put_watermark_text(frame.copy(), (255, 255, 255))
+    cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0, dst=frame)
+    return frame
+
+
+def watermark_mask(width: int, height: int) -> numpy.ndarray:
+    '''
+    水印实际覆盖的像素（255），作为蒙版 IoU 的参照
+    '''
+    return put_watermark_text(numpy.zeros((height, width), numpy.uint8), 255)
+
+
+def synthesize_frames(width: int, height: int, count: int = 8, seed: int = 0, watermark: bool = True) -> list:
+    '''
+    生成 count 帧带水印的画面，背景逐帧平移
+    :param watermark: False 时返回同样的无水印画面，作为修复质量（PSNR）的参照
+    '''
+    background = render_background(width, height, seed)
+    scale = height / 1080
+    frames = []
+    for i in range(count):
+        shift = (int(i * 37 * scale), int(i * 53 * scale))
+        frame = numpy.ascontiguousarray(numpy.roll(background, shift=shift, axis=(0, 1)))
+        frames.append(draw_watermark(frame) if watermark else frame)
+    return frames
+
+
+def write_clip(path: str, width: int, height: int, frame_count: int, fps: float = 30, seed: int = 0) -> str:
+    '''
+    把合成帧写成视频文件（无音轨）
+    :return: 文件路径
+    '''
+    frames = synthesize_frames(width, height, min(frame_count, 16), seed)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    for i in range(frame_count):
+        writer.write(frames[i % len(frames)])
+    writer.release()
+    return path
@@ -1,18 +1,58 @@
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
 from bs4 import BeautifulSoup
-import time, os
+from hashlib import md5
+from functools import reduce
+from urllib.parse import urlencode
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
+from state import bvid_pattern
+import time, os, queue, sqlite3, threading, requests
+
+try:
+    from selenium import webdriver
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import TimeoutException, WebDriverException
+except ImportError:  # 只用 HTTP 模式时不需要 selenium
+    webdriver = None
 
 
 log_save_path = "./log/"
 output_path = "./output/"
 
 output_file = log_save_path + "download_list.log"
+index_file = "./bvid/index.db"  # 已知 BV 号索引（SQLite），记录每个 BV 号的关键词和首次发现时间
+early_stop_pages = 3    # 某关键词连续多少页都只有已知 BV 号时提前结束（0 为不提前结束）
+
+search_mode = "http"    # "http"：直接请求搜索接口（失败时回退浏览器）；"selenium"：用浏览器爬取
+search_workers = 4      # 同时爬取的关键词数
+search_rate = 2.0       # 所有关键词共享的请求速率上限（次/秒）
+search_retries = 3      # 搜索接口被限流（412/429）或出错（5xx）时的重试次数
+search_backoff = 2.0    # 重试的初始等待时间（秒），之后每次翻倍；响应带 Retry-After 时以其为准
+max_retry_wait = 60     # 单次重试最长等待时间（秒）
+total_page = 34         # B站最多显示34页
+
+browser_workers = 2     # 浏览器模式下常驻的无头浏览器数量
+page_timeout = 15       # 浏览器模式下等待搜索结果出现的最长时间（秒）
+
+home_url = "https://www.bilibili.com/"
+nav_api = "https://api.bilibili.com/x/web-interface/nav"
+search_api = "https://api.bilibili.com/x/web-interface/wbi/search/type"
+
+headers = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Referer": "https://search.bilibili.com/",
+    "Accept-Language": "zh-CN,zh;q=0.9",
+}
+
+print_lock = threading.Lock()
+write_lock = threading.Lock()
 
 # 创建不存在的目录
 os.makedirs(log_save_path, exist_ok=True)
 os.makedirs(output_path, exist_ok=True)
+os.makedirs(os.path.dirname(index_file), exist_ok=True)
 
 def write_bvids_to_txt(filename, bv_list):
     # 确保bvid文件夹存在，如果不存在则创建
@@ -21,25 +61,315 @@ def write_bvids_to_txt(filename, bv_list):
     # 拼接完整的文件路径
     filepath = os.path.join('bvid', filename)
 
-    with open(filepath, 'a', encoding='utf-8') as f:
+    with write_lock, open(filepath, 'a', encoding='utf-8') as f:
         for bvid in bv_list:
             if bvid != "cheese":
                 f.write(bvid + '\n')  # 每行写一个BV号
 
 
-def spider_bvid(keyword):
-    """
-    利用seleniume获取搜索结果的bvid，供给后续程序使用
+def safe_print(*args, **kwargs):
+    with print_lock:
+        print(*args, **kwargs)
+
+
+# ========== 已知 BV 号索引 ==========
+class BvIndex():
+    '''
+    持久化的 BV 号索引：每个 BV 号首次发现的时间和所属运行批次，以及搜到它的关键词
+    每次运行开始时新建一个批次，download_list.log 只写入本批次首次发现的 BV 号
+    '''
+
+    def __init__(self, path: str = index_file, on_new=None):
+        '''
+        :param on_new: 每发现一批全局新 BV 号时调用 on_new(BV号列表)，供 pipeline.py 直接把新 BV 号交给下游
+        '''
+        self.on_new = on_new
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                started REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS bvids (
+                bvid TEXT PRIMARY KEY,
+                first_seen REAL NOT NULL,
+                run_id INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_bvids_run ON bvids (run_id);
+            CREATE TABLE IF NOT EXISTS bvid_keywords (
+                bvid TEXT NOT NULL,
+                keyword TEXT NOT NULL,
+                first_seen REAL NOT NULL,
+                PRIMARY KEY (bvid, keyword)
+            );
+        ''')
+        with self.conn:
+            self.run_id = self.conn.execute("INSERT INTO runs (started) VALUES (?)", (time.time(),)).lastrowid
+
+    def import_folder(self, folder_path: str = "./bvid"):
+        '''
+        首次使用索引时导入已有的 {关键词}BV号.log，这些 BV 号不算作新发现
+        '''
+        with self.lock:
+            if self.conn.execute("SELECT 1 FROM bvids LIMIT 1").fetchone():
+                return 0
+            count = 0
+            now = time.time()
+            with self.conn:
+                for filename in os.listdir(folder_path):
+                    if not filename.endswith("BV号.log"):
+                        continue
+                    keyword = filename[:-len("BV号.log")]
+                    with open(os.path.join(folder_path, filename), 'r', encoding='utf-8') as f:
+                        bvids = {line.strip() for line in f if line.strip().startswith("BV")}
+                    self.conn.executemany("INSERT OR IGNORE INTO bvids VALUES (?, ?, 0)", ((b, now) for b in bvids))
+                    self.conn.executemany("INSERT OR IGNORE INTO bvid_keywords VALUES (?, ?, ?)",
+                                          ((b, keyword, now) for b in bvids))
+                    count += len(bvids)
+            return count
+
+    def add(self, keyword: str, bvids: list):
+        '''
+        记录一页搜索结果
+        :return: (该关键词首次搜到的 BV 号, 全局首次发现的 BV 号)
+        '''
+        now = time.time()
+        new_for_keyword, new_global = [], []
+        with self.lock, self.conn:
+            for bvid in bvids:
+                if self.conn.execute("INSERT OR IGNORE INTO bvids VALUES (?, ?, ?)", (bvid, now, self.run_id)).rowcount:
+                    new_global.append(bvid)
+                if self.conn.execute("INSERT OR IGNORE INTO bvid_keywords VALUES (?, ?, ?)", (bvid, keyword, now)).rowcount:
+                    new_for_keyword.append(bvid)
+        if self.on_new and new_global:
+            self.on_new(new_global)  # 在锁外调用，下游队列满时只阻塞当前关键词
+        return new_for_keyword, new_global
+
+    def new_bvids(self, run_id: int = None) -> list:
+        '''
+        某次运行（默认本次）首次发现的 BV 号，按发现顺序
+        '''
+        with self.lock:
+            rows = self.conn.execute("SELECT bvid FROM bvids WHERE run_id = ? ORDER BY first_seen, rowid",
+                                     (self.run_id if run_id is None else run_id,))
+            return [row[0] for row in rows]
+
+    def close(self):
+        self.conn.close()
+
+
+def record_page(keyword, bvids, seen, index=None):
+    '''
+    记录一页搜索结果：本次爬取内去重，写入 bvid/{keyword}BV号.log，并更新索引
+    有索引时只追加该关键词以前没搜到过的 BV 号，多次运行不会产生重复行
+    :param seen: 本次爬取该关键词已见过的 BV 号
+    :return: (写入文件的 BV 号, 全局首次发现的 BV 号)
+    '''
+    # 只保留合法的 BV 号（搜索结果中可能混有课程等条目，如 "cheese"）
+    page_bvids = [bvid for bvid in dict.fromkeys(bvids) if bvid not in seen and bvid_pattern.fullmatch(bvid or "")]
+    seen.update(dict.fromkeys(page_bvids))
+    if index is None:
+        write_bvids_to_txt(f'{keyword}BV号.log', page_bvids)
+        return page_bvids, page_bvids
+
+    new_for_keyword, new_global = index.add(keyword, page_bvids)
+    write_bvids_to_txt(f'{keyword}BV号.log', new_for_keyword)
+    return new_for_keyword, new_global
+
+
+def should_stop_early(known_streak, index):
+    return index is not None and early_stop_pages > 0 and known_streak >= early_stop_pages
+
+
+# ========== 共享限速 ==========
+class RateLimiter():
+    '''
+    令牌桶限速，所有爬取线程共享，避免请求过快被 412 拦截
+    '''
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# ========== 搜索接口签名（WBI） ==========
+mixin_key_enc_tab = [
+    46, 47, 18, 2, 53, 8, 23, 32, 15, 50, 10, 31, 58, 3, 45, 35, 27, 43, 5, 49,
+    33, 9, 42, 19, 29, 28, 14, 39, 12, 38, 41, 13, 37, 48, 7, 16, 24, 55, 40,
+    61, 26, 17, 0, 1, 60, 51, 30, 4, 22, 25, 54, 21, 56, 59, 6, 63, 57, 62, 11,
+    36, 20, 34, 44, 52
+]
+
+def get_mixin_key(session) -> str:
+    '''
+    从 nav 接口取得 img_key / sub_key，打乱后得到签名密钥
+    '''
+    wbi_img = session.get(nav_api, timeout=10).json()["data"]["wbi_img"]
+    img_key = wbi_img["img_url"].rsplit("/", 1)[1].split(".")[0]
+    sub_key = wbi_img["sub_url"].rsplit("/", 1)[1].split(".")[0]
+    orig = img_key + sub_key
+    return reduce(lambda s, i: s + orig[i], mixin_key_enc_tab, "")[:32]
+
+
+def sign_params(params: dict, mixin_key: str) -> dict:
+    params = dict(params, wts=int(time.time()))
+    params = {k: "".join(c for c in str(v) if c not in "!'()*") for k, v in sorted(params.items())}
+    params["w_rid"] = md5((urlencode(params) + mixin_key).encode()).hexdigest()
+    return params
+
+
+# ========== HTTP 模式 ==========
+def create_search_session():
+    '''
+    创建搜索会话：先访问首页拿到 buvid3 等 cookie，再取得签名密钥
+    :return: (session, mixin_key)
+    '''
+    session = requests.Session()
+    session.headers.update(headers)
+    session.get(home_url, timeout=10)
+    return session, get_mixin_key(session)
+
+
+def retry_wait(response, attempt):
+    '''
+    重试前等待的秒数：优先使用响应的 Retry-After（秒数或 HTTP 日期），否则按 search_backoff 指数退避
+    '''
+    value = response.headers.get("Retry-After") if response is not None else None
+    if value:
+        try:
+            return min(max(0.0, float(value)), max_retry_wait)
+        except ValueError:
+            try:
+                return min(max(0.0, parsedate_to_datetime(value).timestamp() - time.time()), max_retry_wait)
+            except (TypeError, ValueError):
+                pass
+    return min(search_backoff * 2 ** attempt, max_retry_wait)
+
+
+def search_page(session, mixin_key, limiter, keyword, page):
+    '''
+    请求一页视频搜索结果，被限流（412/429）、服务器出错（5xx）或连接失败时退避重试
+    :return: (本页 BV 号列表, 总页数)
+    '''
+    for attempt in range(search_retries + 1):
+        limiter.acquire()
+        params = sign_params({"search_type": "video", "keyword": keyword, "page": page}, mixin_key)  # 每次重试重新签名
+        response = None
+        try:
+            response = session.get(search_api, params=params, timeout=10)
+            if response.status_code not in (412, 429) and response.status_code < 500:
+                break
+            error = IOError(f"搜索接口返回 HTTP {response.status_code}")
+        except requests.RequestException as e:
+            error = e
+        if attempt == search_retries:
+            raise error
+        wait = retry_wait(response, attempt)
+        safe_print(f"{keyword}：第{page}页请求失败（{error}），{wait:.1f} 秒后重试")
+        time.sleep(wait)
+
+    if response.status_code != 200:
+        raise IOError(f"搜索接口返回 HTTP {response.status_code}")
+    body = response.json()
+    if body.get("code") != 0:
+        raise IOError(f"搜索接口返回错误 {body.get('code')}: {body.get('message')}")
+    data = body.get("data") or {}
+    bvids = [item["bvid"] for item in data.get("result") or [] if item.get("bvid")]
+    return bvids, data.get("numPages") or 0
+
+
+def spider_bvid_http(keyword, session, mixin_key, limiter, index=None):
+    '''
+    直接请求搜索接口获取 bvid，输出与 spider_bvid 相同的 bvid/{keyword}BV号.log
     :param keyword: 搜索关键词
-    :return: 生成去重的output_filename = f'{keyword}BV号.txt'
-    """
-    # 保存的文件名
-    input_filename = f'{keyword}BV号.log'
-    
+    :param index: BvIndex，连续 early_stop_pages 页没有新 BV 号时提前结束
+    :return: 本关键词本次搜到的 BV 号数量
+    '''
+    seen = {}
+    known_streak = 0
+
+    pages = total_page
+    page = 1
+    while page <= pages:
+        bvids, num_pages = search_page(session, mixin_key, limiter, keyword, page)
+        if page == 1:
+            pages = min(total_page, num_pages)  # 结果不足34页时提前结束
+
+        # 本页去重后写入
+        written, new_global = record_page(keyword, bvids, seen, index)
+        safe_print(f"{keyword}：第{page}/{pages}页，新增 {len(new_global)} 个BV号")
+
+        known_streak = 0 if new_global else known_streak + 1
+        if should_stop_early(known_streak, index):
+            safe_print(f"{keyword}：连续 {known_streak} 页都是已知BV号，提前结束")
+            break
+        if not bvids:
+            break
+        page += 1
+
+    return len(seen)
+
 
-    print(f"爬虫,启动!")
+def crawl_keywords_http(keywords, index=None):
+    '''
+    多个关键词并发爬取，共享会话与限速；某个关键词失败时回退到浏览器模式
+    '''
+    try:
+        session, mixin_key = create_search_session()
+    except (requests.RequestException, IOError, ValueError, KeyError) as e:
+        safe_print(f"创建搜索会话失败：{e}")
+        if webdriver is None:
+            safe_print("未安装 selenium，无法回退浏览器模式，本次不爬取任何关键词")
+            return
+        safe_print("所有关键词改用浏览器爬取")
+        crawl_keywords_selenium(keywords, index=index)
+        return
+    limiter = RateLimiter(search_rate)
+    fallback_pool = BrowserPool(browser_workers) if webdriver is not None else None
 
-    # 启动爬虫
+    def crawl(keyword):
+        safe_print(f"开始爬取关键词: {keyword}")
+        try:
+            count = spider_bvid_http(keyword, session, mixin_key, limiter, index)
+            safe_print(f"已完成关键词: {keyword}，共 {count} 个BV号")
+        except (requests.RequestException, IOError, ValueError, KeyError) as e:
+            safe_print(f"关键词 {keyword} 的 HTTP 爬取失败：{e}")
+            if webdriver is None:
+                safe_print(f"未安装 selenium，无法回退浏览器模式，跳过关键词: {keyword}")
+                return
+            safe_print(f"改用浏览器爬取关键词: {keyword}")
+            crawl_keywords_selenium([keyword], fallback_pool, index)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, search_workers)) as executor:
+            list(executor.map(crawl, keywords))
+    finally:
+        if fallback_pool:
+            fallback_pool.close()
+
+
+# ========== 浏览器模式 ==========
+def create_browser():
+    '''
+    启动一个无头浏览器，并先进入B站首页拿到 cookie
+    '''
     options = Options()
     options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
                      "AppleWebKit/537.36 (KHTML, like Gecko) "
@@ -49,97 +379,206 @@ def spider_bvid(keyword):
     browser = webdriver.Chrome(options=options)  # 设置无界面爬虫
     browser.set_window_size(1400, 900)  # 设置全屏，注意把窗口设置太小的话可能导致有些button无法点击
     browser.get('https://bilibili.com')
-    # 刷新一下，防止搜索button被登录弹框遮住
-    browser.refresh()
-    print("============成功进入B站首页！！！===========")
-
-    input = browser.find_element(By.CLASS_NAME, 'nav-search-input')
-    button = browser.find_element(By.CLASS_NAME, 'nav-search-btn')
- 
-    # 输入关键词并点击搜索
-    input.send_keys(keyword)
-    button.click()
-    print(f'==========成功搜索{keyword}相关内容==========')
-
-    # 设置窗口
-    all_h = browser.window_handles
-    browser.switch_to.window(all_h[1])
- 
-    # B站最多显示34页
-    total_page = 34
- 
-    for i in range(0, total_page):
-        # url 需要根据不同关键词进行调整内容！！！
-        # 这里的url需要自己先搜索一下然后复制网址进来
-
-        if i == 1:
-            print(f"跳过骨架屏\n")
-            continue  # 为骨架屏，直接跳过这一轮，不执行下面代码
-
-        url = (f"https://search.bilibili.com/all?keyword={keyword}"
-               f"&from_source=webtop_search&spm_id_from=333.1007&search_source=5&page={i}")
-
-        if i == 0 :
-            print(f"===========正在尝试获取第{i + 1}页网页内容===========")
-            print(f"===========本次的url为：{url}===========")
-        else :
-            print(f"===========正在尝试获取第{i}页网页内容===========")
-            print(f"===========本次的url为：{url}===========")
-
-        browser.get(url)
-        # 这里请求访问网页的时间也比较久(可能因为我是macos)，所以是否需要等待因设备而异
-        # 取消刷新并长时间休眠爬虫以避免爬取太快导致爬虫抓取到js动态加载源码
-        # browser.refresh()
-        print('正在等待页面加载：3')
-        time.sleep(1)
-        print('正在等待页面加载：2')
-        time.sleep(1)
-        print('正在等待页面加载：1')
-        time.sleep(2)
-
-
-        # 直接分析网页
-        html = browser.page_source
-        # print("网页源码" + html) 用于判断是否获取成功
-        soup = BeautifulSoup(html, 'lxml')
-        infos = soup.find_all(class_='bili-video-card')
-        bv_id_list = []
-        for info in infos:
-            # 只定位视频链接
-            href = info.find('a').get('href')
-            # 拆分
-            split_url_data = href.split('/')
-            # 利用循环删除拆分出现的空白
-            for element in split_url_data:
-                if element == '':
-                    split_url_data.remove(element)
-            # 打印检验内容
-            # print(split_url_data)
-            # 获取bvid
-            bvid = split_url_data[2]
- 
-            # 利用if语句直接去重
-            if bvid not in bv_id_list:
-                bv_id_list.append(bvid)
-
-            
-        # bv_id_list 是BV号列表，input_filename 是目标文件名
-        write_bvids_to_txt(input_filename, bv_id_list)
-
-        # 输出提示进度
-        print('写入文件成功')
-        if i == 0 :
-            print("===========成功获取第" + str(i + 1) + "次===========\n")
-        else :
-            print("===========成功获取第" + str(i) + "次===========\n")
-        time.sleep(1)
-        i += 1
- 
-    # 退出爬虫
-    browser.quit()
- 
+    return browser
+
+
+class BrowserPool():
+    '''
+    常驻无头浏览器池，多个关键词共享，避免每个关键词都重新启动浏览器
+    浏览器按需创建，最多 size 个
+    '''
+
+    def __init__(self, size: int):
+        self.size = max(1, size)
+        self.idle = queue.Queue()
+        self.browsers = []
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                if self.idle.empty() and len(self.browsers) < self.size:
+                    browser = create_browser()
+                    self.browsers.append(browser)
+                    safe_print(f"============已启动第{len(self.browsers)}个浏览器===========")
+                    return browser
+            browser = self.idle.get()
+            if browser is not None:
+                return browser
+            # None 表示有浏览器被丢弃，空出了名额，回到开头新建
+
+    def release(self, browser):
+        self.idle.put(browser)
+
+    def discard(self, browser):
+        '''
+        关闭出错的浏览器并移出浏览器池，下一次 acquire 会新建一个代替它
+        '''
+        with self.lock:
+            if browser in self.browsers:
+                self.browsers.remove(browser)
+        try:
+            browser.quit()
+        except WebDriverException:
+            pass  # 浏览器可能已经崩溃
+        self.idle.put(None)  # 唤醒正在等待空闲浏览器的线程
+
+    def close(self):
+        for browser in self.browsers:
+            try:
+                browser.quit()
+            except WebDriverException:
+                pass
+        self.browsers = []
+
+
+def wait_for_cards(browser):
+    '''
+    等待搜索结果卡片（带视频链接）出现，代替固定时长的 sleep
+    :return: 是否等到了结果
+    '''
+    try:
+        WebDriverWait(browser, page_timeout).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, '.bili-video-card a[href*="/video/BV"]')))
+        return True
+    except TimeoutException:
+        return False
+
+
+def read_page_count(browser):
+    '''
+    读取分页按钮上的最大页码，没有分页时为 1 页
+    '''
+    numbers = []
+    for button in browser.find_elements(By.CSS_SELECTOR, '.vui_pagenation--btn-num'):
+        text = button.text.strip()
+        if text.isdigit():
+            numbers.append(int(text))
+    return max(numbers) if numbers else 1
+
+
+def spider_bvid(keyword, browser=None, index=None):
+    """
+    利用seleniume获取搜索结果的bvid，供给后续程序使用
+    :param keyword: 搜索关键词
+    :param browser: 浏览器池中的浏览器，None 时临时启动一个
+    :param index: BvIndex，连续 early_stop_pages 页没有新 BV 号时提前结束
+    :return: 生成去重的output_filename = f'{keyword}BV号.txt'
+    """
+    own_browser = browser is None
+    if own_browser:
+        safe_print(f"爬虫,启动!")
+        browser = create_browser()
+
+    seen = {}
+    known_streak = 0
+    timings = []
+    pages = total_page
+    page = 1
+
+    try:
+        while page <= pages:
+            url = (f"https://search.bilibili.com/all?keyword={keyword}"
+                   f"&from_source=webtop_search&spm_id_from=333.1007&search_source=5&page={page}")
+
+            start = time.perf_counter()
+            browser.get(url)
+            found = wait_for_cards(browser)
+            timings.append(time.perf_counter() - start)
+
+            if not found:
+                safe_print(f"{keyword}：第{page}页在 {page_timeout} 秒内没有搜索结果，结束该关键词")
+                break
+
+            if page == 1:
+                pages = min(total_page, read_page_count(browser))  # 结果不足34页时提前结束
+
+            # 直接分析网页
+            html = browser.page_source
+            soup = BeautifulSoup(html, 'lxml')
+            infos = soup.find_all(class_='bili-video-card')
+            bvids = []
+            for info in infos:
+                # 只定位视频链接
+                link = info.find('a')
+                href = link.get('href') if link else None
+                if not href:
+                    continue
+                # 拆分并删除拆分出现的空白
+                split_url_data = [element for element in href.split('/') if element != '']
+                if len(split_url_data) < 3:
+                    continue
+                # 获取bvid
+                bvids.append(split_url_data[2])
+
+            # 去重后写入 {keyword}BV号.log
+            written, new_global = record_page(keyword, bvids, seen, index)
+
+            # 输出提示进度
+            safe_print(f"{keyword}：第{page}/{pages}页，新增 {len(new_global)} 个BV号，加载用时 {timings[-1]:.2f} 秒")
+
+            known_streak = 0 if new_global else known_streak + 1
+            if should_stop_early(known_streak, index):
+                safe_print(f"{keyword}：连续 {known_streak} 页都是已知BV号，提前结束")
+                break
+            page += 1
+
+    finally:
+        if own_browser:
+            browser.quit()
+
     # 打印信息显示是否成功
-    print(f'==========爬取完成。退出爬虫==========')
+    if timings:
+        safe_print(f'=========={keyword} 爬取完成：共 {len(timings)} 页，'
+                   f'平均每页 {sum(timings) / len(timings):.2f} 秒，最慢 {max(timings):.2f} 秒==========')
+    return timings
+
+
+def crawl_keywords_selenium(keywords, pool=None, index=None):
+    '''
+    把关键词分给浏览器池中的浏览器并发爬取
+    '''
+    own_pool = pool is None
+    pool = pool or BrowserPool(browser_workers)
+
+    def crawl(keyword):
+        try:
+            browser = pool.acquire()
+        except WebDriverException as e:
+            safe_print(f"启动浏览器失败，跳过关键词 {keyword}：{e}")
+            return
+        broken = False
+        try:
+            safe_print(f"开始爬取关键词: {keyword}")
+            spider_bvid(keyword, browser, index)
+            safe_print(f"已完成关键词: {keyword}")
+        except (WebDriverException, TimeoutException) as e:
+            broken = True
+            safe_print(f"关键词 {keyword} 的浏览器爬取失败：{e}")
+        finally:
+            # 出错的浏览器可能已崩溃或停在异常页面，不放回浏览器池，换一个新的
+            if broken:
+                pool.discard(browser)
+            else:
+                pool.release(browser)
+
+    try:
+        with ThreadPoolExecutor(max_workers=pool.size) as executor:
+            list(executor.map(crawl, keywords))
+    finally:
+        if own_pool:
+            pool.close()
+
+
+def write_download_list(index):
+    '''
+    只把本次运行新发现的 BV 号写入 download_list.log
+    '''
+    new_bvids = index.new_bvids()
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(new_bvids))
+
+    print(f"本次新发现 {len(new_bvids)} 个 BV 号，已写入 {output_file}")
 
 
 if __name__ == "__main__":
@@ -148,30 +587,17 @@ if __name__ == "__main__":
         keywords = [line.strip() for line in f 
                    if line.strip() and not line.startswith("#")]
 
-    # 循环处理每个关键词
-    for keyword in keywords:
-        print(f"开始爬取关键词: {keyword}")
-        spider_bvid(keyword)
-        print(f"已完成关键词: {keyword}")
+    index = BvIndex(index_file)
+    imported = index.import_folder("./bvid")
+    if imported:
+        print(f"已把 ./bvid/ 中的 {imported} 个 BV 号导入索引")
 
-    print("所有关键词处理完毕！")
-
-    folder_path = "./bvid"  # 存放 LOG 的文件夹路径
-
-    # 读取所有 BV 号并去重（仅保留以 "BV" 开头的）
-    bv_set = set()
-    for filename in os.listdir(folder_path):
-        if filename.endswith(".log"):
-            with open(os.path.join(folder_path, filename), 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()  # 去除首尾空白字符
-                    if line.startswith("BV"):  # 仅保留以 "BV" 开头的行
-                        bv_set.add(line)
+    if search_mode == "http":
+        crawl_keywords_http(keywords, index)
+    else:
+        crawl_keywords_selenium(keywords, index=index)
 
-    # 写入新文件
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write('\n'.join(bv_set))
+    print("所有关键词处理完毕！")
 
-    print(f"合并完成，共 {len(bv_set)} 个唯一 BV 号。")
- 
- 
\ No newline at end of file
+    write_download_list(index)
+    index.close()
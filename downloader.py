@@ -0,0 +1,319 @@
+import os
+import re
+import json
+import time
+import threading
+import requests
+import html as html_lib
+
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+
+
+# ========== 配置项 ==========
+chunk_size = 8 * 1024 * 1024   # 每个 Range 分片的大小
+connections = 4                # 每条轨道的并发连接数
+retries = 3                    # 每个分片的重试次数
+timeout = 30                   # 单次请求超时（秒）
+
+headers = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Referer": "https://www.bilibili.com/",
+    "Origin": "https://www.bilibili.com",
+}
+
+playurl_api = "https://api.bilibili.com/x/player/playurl"
+
+# 格式码（与 scraper.py 的清晰度一致） -> (B站清晰度 qn, 首选编码 codecid：7 为 AVC，12 为 HEVC)
+quality_qn_map = {
+    'dash-hdflv2_4k-HEVC': (120, 12),
+    'dash-flv_p60-AVC': (116, 7),
+    'dash-flv-AVC': (80, 7),
+    'dash-flv720-AVC': (64, 7),
+}
+
+print_lock = threading.Lock()
+
+playinfo_pattern = re.compile(r'window\.__playinfo__\s*=\s*')
+initial_state_pattern = re.compile(r'window\.__INITIAL_STATE__\s*=\s*')
+title_pattern = re.compile(r'<title[^>]*>(.*?)(?:_哔哩哔哩_bilibili)?</title>', re.S | re.I)
+json_decoder = json.JSONDecoder()
+
+
+def safe_print(*args, **kwargs):
+    with print_lock:
+        print(*args, **kwargs)
+
+
+# ========== 会话与 cookie ==========
+def create_session(cookie_file=None, pool_size=connections * 2):
+    '''
+    创建带连接池的会话，可加载 scraper.get_bilibili_cookies 生成的 cookies.txt
+    :param cookie_file: cookies.txt 路径
+    :param pool_size: 连接池大小（音视频两条轨道共享）
+    :return: requests.Session
+    '''
+    session = requests.Session()
+    session.headers.update(headers)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    if cookie_file and os.path.exists(cookie_file):
+        with open(cookie_file, "r", encoding="utf-8") as f:
+            for line in f:
+                fields = line.rstrip("\n").split("\t")
+                if line.startswith("#") or len(fields) != 7:
+                    continue
+                domain, _, path, secure, _, name, value = fields
+                session.cookies.set(name, value, domain=domain, path=path, secure=secure == "TRUE")
+    return session
+
+
+# ========== 解析 DASH 轨道 ==========
+def extract_json(html, pattern):
+    match = pattern.search(html)
+    if not match:
+        return None
+    value, _ = json_decoder.raw_decode(html, match.end())
+    return value
+
+
+def pick_tracks(dash, quality):
+    '''
+    选出不高于所选清晰度的最高视频轨（优先所选编码）和码率最高的音频轨
+    :return: (视频轨, 音频轨)，找不到时对应项为 None
+    '''
+    qn, codecid = quality_qn_map.get(quality, (64, 7))
+    videos = [v for v in dash.get("video") or [] if v["id"] <= qn]
+    video = None
+    if videos:
+        best_id = max(v["id"] for v in videos)
+        candidates = [v for v in videos if v["id"] == best_id]
+        preferred = [v for v in candidates if v.get("codecid") == codecid]
+        video = max(preferred or candidates, key=lambda v: v.get("bandwidth", 0))
+
+    audios = list(dash.get("audio") or [])
+    if dash.get("flac") and dash["flac"].get("audio"):
+        audios.append(dash["flac"]["audio"])
+    audio = max(audios, key=lambda a: a.get("bandwidth", 0)) if audios else None
+    return video, audio
+
+
+def track_urls(track):
+    '''
+    主地址在前，备用地址在后
+    '''
+    urls = [track.get("baseUrl") or track.get("base_url")]
+    urls += track.get("backupUrl") or track.get("backup_url") or []
+    return [u for u in urls if u]
+
+
+def resolve_dash_tracks(session, url, quality):
+    '''
+    从视频页的 __playinfo__ 中读取 DASH 轨道，页面中没有时改用 playurl 接口
+    :return: (标题, 视频轨, 音频轨)
+    '''
+    response = session.get(url, timeout=timeout)
+    response.raise_for_status()
+    response.encoding = "utf-8"  # B站页面均为 UTF-8
+    html = response.text
+
+    title_match = title_pattern.search(html)
+    title = html_lib.unescape(title_match.group(1)).strip() if title_match else url.rstrip("/").split("/")[-1]
+
+    playinfo = extract_json(html, playinfo_pattern)
+    dash = (playinfo or {}).get("data", {}).get("dash")
+
+    if not dash:
+        state = extract_json(html, initial_state_pattern) or {}
+        video_data = state.get("videoData") or {}
+        params = {"bvid": video_data.get("bvid"), "cid": video_data.get("cid"),
+                  "qn": quality_qn_map.get(quality, (64, 7))[0], "fnval": 4048, "fourk": 1}
+        if not params["bvid"] or not params["cid"]:
+            raise ValueError("页面中未找到 __playinfo__ 或 bvid/cid")
+        response = session.get(playurl_api, params=params, timeout=timeout)
+        response.raise_for_status()
+        dash = response.json().get("data", {}).get("dash")
+        if not dash:
+            raise ValueError("playurl 接口未返回 DASH 轨道")
+
+    video, audio = pick_tracks(dash, quality)
+    if video is None or audio is None:
+        raise ValueError(f"没有不高于 {quality} 的音视频轨道")
+    return title, video, audio
+
+
+# ========== Range 分片下载 ==========
+def content_length(session, url):
+    '''
+    用 Range: bytes=0-0 探测文件大小和是否支持分片
+    :return: (文件大小, 是否支持 Range)
+    '''
+    with session.get(url, headers={"Range": "bytes=0-0"}, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        content_range = response.headers.get("Content-Range", "")
+        if response.status_code == 206 and "/" in content_range:
+            total = content_range.rsplit("/", 1)[1]
+            if total.isdigit():
+                return int(total), True
+        return int(response.headers.get("Content-Length", 0)), False
+
+
+def save_checkpoint(state_path, state):
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, state_path)
+
+
+def fetch_range(session, urls, part_path, start, end):
+    '''
+    下载 [start, end] 字节并写入 part 文件对应位置，主地址失败时依次尝试备用地址
+    '''
+    last_error = None
+    for attempt in range(retries):
+        url = urls[attempt % len(urls)]
+        try:
+            with session.get(url, headers={"Range": f"bytes={start}-{end}"}, stream=True, timeout=timeout) as response:
+                if response.status_code != 206:
+                    raise IOError(f"分片请求返回 {response.status_code}")
+                written = 0
+                with open(part_path, "r+b") as f:
+                    f.seek(start)
+                    for block in response.iter_content(256 * 1024):
+                        f.write(block)
+                        written += len(block)
+            if written != end - start + 1:
+                raise IOError(f"分片大小不符：期望 {end - start + 1}，实际 {written}")
+            return
+        except (requests.RequestException, IOError) as e:
+            last_error = e
+            time.sleep(min(2 ** attempt, 10))
+    raise IOError(f"分片 {start}-{end} 下载失败：{last_error}")
+
+
+def fetch_whole(session, urls, part_path, total=0):
+    '''
+    服务器不支持 Range 时整体下载，写入大小与 Content-Length 不符（连接中途断开）时重试，主地址失败时依次尝试备用地址
+    :param total: 探测到的文件大小，响应中没有 Content-Length 时用它校验
+    :return: 文件大小
+    '''
+    last_error = None
+    for attempt in range(retries):
+        url = urls[attempt % len(urls)]
+        try:
+            with session.get(url, stream=True, timeout=timeout) as response:
+                response.raise_for_status()
+                # 压缩传输时 Content-Length 是压缩后的大小，无法与解压后写入的字节数比较
+                encoded = response.headers.get("Content-Encoding", "identity") != "identity"
+                expected = 0 if encoded else int(response.headers.get("Content-Length") or total or 0)
+                written = 0
+                with open(part_path, "wb") as f:
+                    for block in response.iter_content(256 * 1024):
+                        f.write(block)
+                        written += len(block)
+            if expected and written != expected:
+                raise IOError(f"文件大小不符：期望 {expected}，实际 {written}")
+            return written
+        except (requests.RequestException, IOError, ValueError) as e:
+            last_error = e
+            time.sleep(min(2 ** attempt, 10))
+    raise IOError(f"整体下载失败：{last_error}")
+
+
+def download_file(session, urls, dest, chunk=None, workers=None):
+    '''
+    多连接分片下载单个文件，已完成的分片记录在 dest.part.json，中断后重新运行会跳过这些分片
+    :param urls: 主地址与备用地址
+    :param dest: 保存路径
+    :return: 文件大小
+    '''
+    if isinstance(urls, str):
+        urls = [urls]
+    chunk = chunk or chunk_size
+    workers = workers or connections
+    part_path = dest + ".part"
+    state_path = dest + ".part.json"
+
+    total, ranged = content_length(session, urls[0])
+    if not ranged or total <= 0:
+        fetch_whole(session, urls, part_path, total)  # 大小不符时抛出异常，不会把不完整的文件改名为 dest
+        os.replace(part_path, dest)
+        return os.path.getsize(dest)
+
+    # 读取断点：文件大小与分片大小一致时才沿用
+    state = None
+    if os.path.exists(state_path) and os.path.exists(part_path):
+        try:
+            with open(state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except ValueError:
+            state = None
+        if state and (state.get("total") != total or state.get("chunk") != chunk or os.path.getsize(part_path) != total):
+            state = None
+    if state is None:
+        state = {"total": total, "chunk": chunk, "done": []}
+        with open(part_path, "wb") as f:
+            f.truncate(total)  # 预分配，各分片按偏移写入
+        save_checkpoint(state_path, state)
+
+    done = set(state["done"])
+    ranges = [(index, start, min(start + chunk, total) - 1)
+              for index, start in enumerate(range(0, total, chunk)) if index not in done]
+    state_lock = threading.Lock()
+
+    def fetch_chunk(index, start, end):
+        fetch_range(session, urls, part_path, start, end)
+        with state_lock:
+            done.add(index)
+            state["done"] = sorted(done)
+            save_checkpoint(state_path, state)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [executor.submit(fetch_chunk, *r) for r in ranges]
+        for future in futures:
+            future.result()  # 有分片失败时抛出异常，断点保留供下次续传
+
+    # 校验大小后再改名
+    expected_chunks = (total + chunk - 1) // chunk
+    if len(done) != expected_chunks or os.path.getsize(part_path) != total:
+        raise IOError(f"文件大小校验失败：{dest}")
+    os.replace(part_path, dest)
+    os.remove(state_path)
+    return total
+
+
+# ========== 下载一个视频的音视频轨道 ==========
+def download_dash(url, out_dir, quality="dash-flv720-AVC", cookie_file=None, workers=None):
+    '''
+    内置下载器：并发下载视频轨 [00] 和音频轨 [01]，文件名与 you-get 一致，可直接交给 scraper.auto_merge_folder 合并
+    :param url: 视频链接
+    :param out_dir: 保存目录
+    :param quality: 格式码（同 scraper.py）
+    :param cookie_file: cookies.txt 路径
+    :return: 是否下载成功
+    '''
+    workers = workers or connections
+    session = create_session(cookie_file, workers * 2)
+    try:
+        title, video, audio = resolve_dash_tracks(session, url, quality)
+        name = re.sub(r'[\\/:*?"<>|\s]+', ' ', title).strip()[:80] or "video"
+        jobs = [(track_urls(video), os.path.join(out_dir, f"{name}[00].mp4")),
+                (track_urls(audio), os.path.join(out_dir, f"{name}[01].mp4"))]
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(download_file, session, urls, dest, None, workers)
+                       for urls, dest in jobs if not os.path.exists(dest)]
+            for future in futures:
+                future.result()
+
+        safe_print(f"下载完成: {url}, 视频轨 qn={video['id']} codecid={video.get('codecid')}")
+        return True
+
+    except (requests.RequestException, IOError, ValueError, KeyError) as e:
+        safe_print(f"内置下载器下载失败: {url} 错误：{e}")
+        return False
+
+    finally:
+        session.close()
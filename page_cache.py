@@ -0,0 +1,134 @@
+import os
+import json
+import gzip
+import time
+import zlib
+import hashlib
+import threading
+
+from collections import OrderedDict
+
+
+class PageCache():
+    '''
+    视频页面的磁盘缓存：按 URL 的 sha1 存放 gzip 压缩的页面源码
+    - ttl：过期时间（秒），0 或 None 表示永不过期
+    - max_bytes：缓存总大小上限，超出时按最近最少使用（LRU）淘汰
+    - offline：只读缓存、不联网，用于修改解析逻辑后快速重放
+    '''
+
+    def __init__(self, folder: str = "./cache/", ttl: int = 7 * 24 * 3600,
+                 max_bytes: int = 2 * 1024 ** 3, offline: bool = False):
+        self.folder = folder
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # 路径 -> 文件大小，按最近访问时间从旧到新排列
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(folder, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        found = []
+        for root, _, files in os.walk(self.folder):
+            for filename in files:
+                path = os.path.join(root, filename)
+                if filename.endswith(".tmp"):
+                    os.remove(path)  # 上次中断时没写完的文件
+                    continue
+                stat = os.stat(path)
+                found.append((stat.st_mtime, path, stat.st_size))
+
+        for _, path, size in sorted(found):
+            self.entries[path] = size
+            self.total_bytes += size
+
+    def _path(self, url: str) -> str:
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.folder, key[:2], key + ".gz")
+
+    def get(self, url: str):
+        '''
+        读取缓存
+        :return: 页面源码，未命中或已过期时返回 None（离线模式不检查过期）
+        '''
+        path = self._path(url)
+        try:
+            with open(path, "rb") as f:
+                raw = f.read()
+        except OSError:
+            with self.lock:
+                self.misses += 1
+            return None
+
+        try:
+            header, _, body = gzip.decompress(raw).partition(b"\n")
+            meta = json.loads(header)
+            cached_url, fetched_at = meta["url"], float(meta["fetched_at"])
+            text = body.decode("utf-8")
+        except (OSError, EOFError, zlib.error, ValueError, KeyError, TypeError):
+            # 缓存文件损坏（如磁盘错误）：删除后按未命中处理，重新下载时会写入新的缓存
+            self._discard(path)
+            with self.lock:
+                self.misses += 1
+            return None
+
+        if cached_url != url or (self.ttl and not self.offline and time.time() - fetched_at > self.ttl):
+            with self.lock:
+                self.misses += 1
+            return None
+
+        with self.lock:
+            self.hits += 1
+            if path in self.entries:
+                self.entries.move_to_end(path)
+        try:
+            os.utime(path)  # 用修改时间记录最近访问，重启后仍能按 LRU 淘汰
+        except OSError:
+            pass
+        return text
+
+    def put(self, url: str, text: str):
+        '''
+        写入缓存，先写临时文件再改名，保证缓存文件总是完整的
+        '''
+        path = self._path(url)
+        header = json.dumps({"url": url, "fetched_at": time.time()}).encode("utf-8")
+        data = gzip.compress(header + b"\n" + text.encode("utf-8"), compresslevel=6)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self.lock:
+            self.total_bytes += len(data) - self.entries.pop(path, 0)
+            self.entries[path] = len(data)
+            self._evict()
+
+    def _discard(self, path: str):
+        with self.lock:
+            self.total_bytes -= self.entries.pop(path, 0)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _evict(self):
+        # 调用方已持有锁
+        while self.max_bytes and self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            path, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self) -> str:
+        return (f"缓存命中 {self.hits} 次，未命中 {self.misses} 次，"
+                f"共 {len(self.entries)} 个页面 / {self.total_bytes / 1024 ** 2:.1f} MB")
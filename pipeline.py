@@ -0,0 +1,299 @@
+import os
+import time
+import queue
+import itertools
+import threading
+
+import bvid
+import scraper
+import video
+from state import get_store
+from page_cache import PageCache
+
+
+# ========== 配置项 ==========
+keywords_file = "keywords.log"     # 搜索关键词列表（同 bvid.py）
+quality = "dash-flv720-AVC"        # 下载清晰度，格式码同 scraper.py，不可用时向下降级
+
+# 启用的阶段
+enable_metadata = True    # 爬取视频信息
+enable_download = True    # 下载并合并音视频
+enable_watermark = True   # 去水印（需要 enable_download 或已合并的视频）
+
+# 各阶段的工作线程数
+metadata_workers = 4
+download_workers = scraper.download_workers
+merge_workers = scraper.merge_workers
+watermark_workers = 1     # CPU 密集，按核数调整
+
+queue_size = 16           # 每个阶段的队列长度，队列满时上游阻塞等待（背压）
+resume_pending = True     # 启动时把状态库中上次未完成的 BV 号放回对应阶段
+status_interval = 10      # 每隔多少秒打印一次各阶段状态
+
+print_lock = threading.Lock()
+stop_signal = object()
+
+
+def safe_print(*args, **kwargs):
+    with print_lock:
+        print(*args, **kwargs)
+
+
+# ========== 流水线阶段 ==========
+class Stage():
+    '''
+    流水线的一个阶段：workers 个线程从有界队列中取 BV 号处理，处理成功的交给下游阶段
+    处理函数返回 True 表示成功，False 表示失败或跳过（失败原因由各阶段记录到状态库）
+    '''
+
+    def __init__(self, name: str, handler, workers: int, capacity: int = queue_size):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.queue = queue.Queue(maxsize=capacity)
+        self.downstream = []
+        self.on_success = None
+        self.threads = []
+        self.lock = threading.Lock()
+        self.running = 0
+        self.done = 0
+        self.failed = 0
+
+    def start(self):
+        for n in range(self.workers):
+            t = threading.Thread(target=self.run, name=f"{self.name}-{n}", daemon=True)
+            t.start()
+            self.threads.append(t)
+        return self
+
+    def put(self, bvid: str):
+        self.queue.put(bvid)  # 队列满时阻塞，上游随之放慢
+
+    def run(self):
+        while True:
+            bvid = self.queue.get()
+            if bvid is stop_signal:
+                return
+
+            with self.lock:
+                self.running += 1
+            try:
+                success = self.handler(bvid)
+            except Exception as e:
+                safe_print(f"[{self.name}] {bvid} 出错：{e}")
+                success = False
+
+            with self.lock:
+                self.running -= 1
+                if success:
+                    self.done += 1
+                else:
+                    self.failed += 1
+
+            if success:
+                if self.on_success:
+                    self.on_success(bvid)
+                for stage in self.downstream:
+                    stage.put(bvid)
+
+    def close(self):
+        '''
+        上游全部结束后调用：等本阶段处理完队列中的 BV 号，再依次关闭下游
+        '''
+        for _ in self.threads:
+            self.queue.put(stop_signal)
+        for t in self.threads:
+            t.join()
+        for stage in self.downstream:
+            stage.close()
+
+    def line(self) -> str:
+        with self.lock:
+            return f"{self.name}：排队 {self.queue.qsize()} / 进行中 {self.running} / 完成 {self.done} / 失败 {self.failed}"
+
+
+# ========== 端到端流水线 ==========
+class Pipeline():
+    '''
+    把 bvid.py、scraper.py、video.py 串成生产者/消费者流水线：
+    搜索发现的新 BV 号立即进入信息爬取和下载，合并完成的视频立即进入去水印，各阶段同时运行
+    '''
+
+    def __init__(self):
+        self.state = get_store()
+        self.counter = itertools.count(1)
+        self.discovered = {}        # BV 号 -> 进入流水线的时间
+        self.latencies = []
+        self.lock = threading.Lock()
+        self.progress = scraper.DownloadProgress(0)
+        self.qualities = scraper.quality_chain(quality)
+        self.remover = video.WatermarkRemover(threshold=80, kernel_size=5)
+        self.sink = None
+        self.sink_lock = threading.Lock()
+        self.done_urls = set()
+
+        self.metadata = Stage("信息", self.fetch_metadata, metadata_workers) if enable_metadata else None
+        self.download = Stage("下载", self.download_video, download_workers) if enable_download else None
+        self.merge = Stage("合并", self.merge_video, merge_workers) if enable_download else None
+        self.watermark = Stage("去水印", self.remove_watermark, watermark_workers) if enable_watermark else None
+
+        # 下载 -> 合并 -> 去水印，信息爬取是独立的一支
+        if self.download:
+            self.download.downstream.append(self.merge)
+            if self.watermark:
+                self.merge.downstream.append(self.watermark)
+        chain = [stage for stage in (self.download, self.merge, self.watermark) if stage]
+        if chain:
+            chain[-1].on_success = self.finish
+
+        self.stages = [stage for stage in (self.metadata, self.download, self.merge, self.watermark) if stage]
+        self.heads = [stage for stage in (self.metadata, self.download, self.watermark) if stage]
+        if self.download and self.watermark:
+            self.heads.remove(self.watermark)
+
+    # ---------- 各阶段处理函数 ----------
+    def fetch_metadata(self, bvid_str):
+        url = scraper.get_video_url(bvid_str)
+        if url in self.done_urls:
+            return True
+        i, url, row = scraper.fetch_video_info(self.session, next(self.counter), bvid_str, self.cache)
+        if not row:
+            return False
+        with self.sink_lock:
+            self.sink.append(row)
+        return True
+
+    def download_video(self, bvid_str):
+        if self.state.is_done(bvid_str, "merged"):
+            return True
+        job_dir = scraper.download_to_staging(next(self.counter), bvid_str, self.qualities,
+                                              scraper.quality_display_map, self.progress)
+        return job_dir is not None
+
+    def merge_video(self, bvid_str):
+        if self.state.is_done(bvid_str, "merged"):
+            return True
+        job_dir = os.path.join(scraper.staging_path, scraper.job_name(bvid_str))
+        return scraper.merge_job(next(self.counter), bvid_str, job_dir, self.progress)
+
+    def remove_watermark(self, bvid_str):
+        if self.state.is_done(bvid_str, "watermark_removed"):
+            return True
+        names = sorted(os.path.join(video.VIDEO_PATH, name) for name in os.listdir(video.VIDEO_PATH)
+                       if name.lower().endswith(".mp4") and self.remover.extract_bvid(name) == bvid_str)
+        if not names:
+            self.state.fail(bvid_str, "watermark_removed", "未找到合并后的视频文件")
+            return False
+
+        for name in names:
+            error = self.remover.remove_watermark_file(name)
+            if error is not None:
+                self.state.fail(bvid_str, "watermark_removed", error)
+                return False
+
+        self.state.mark(bvid_str, "watermark_removed")
+        return True
+
+    # ---------- 输入与统计 ----------
+    def feed(self, bvids, stages=None):
+        '''
+        把 BV 号放入流水线；默认放入各支的第一个阶段
+        '''
+        self.state.add_listed(bvids)
+        now = time.time()
+        for bvid_str in bvids:
+            with self.lock:
+                self.discovered.setdefault(bvid_str, now)
+            for stage in stages or self.heads:
+                stage.put(bvid_str)
+
+    def finish(self, bvid_str):
+        with self.lock:
+            start = self.discovered.pop(bvid_str, None)
+            if start is None:
+                return
+            elapsed = time.time() - start
+            self.latencies.append(elapsed)
+        safe_print(f"{bvid_str} 已走完流水线，用时 {int(elapsed) // 60}分{int(elapsed) % 60:02d}秒")
+
+    def resume(self):
+        '''
+        上次未完成的 BV 号从中断的阶段继续
+        '''
+        if self.metadata:
+            self.feed(self.state.pending("metadata"), [self.metadata])
+        if self.download:
+            self.feed(self.state.pending("downloaded"), [self.download])
+            self.feed(self.state.pending("merged"), [self.merge])
+        if self.watermark:
+            self.feed(self.state.pending("watermark_removed"), [self.watermark])
+
+    def display(self, stop_event):
+        while not stop_event.wait(status_interval):
+            safe_print("流水线状态：" + "；".join(stage.line() for stage in self.stages))
+
+    # ---------- 运行 ----------
+    def run(self, keywords):
+        self.session = scraper.create_session(metadata_workers)
+        self.cache = (PageCache(scraper.cache_path, scraper.cache_ttl, scraper.cache_max_bytes, scraper.cache_offline)
+                      if scraper.cache_enabled or scraper.cache_offline else None)
+        sink_path = (scraper.output_file if scraper.output_format == "csv"
+                     else os.path.splitext(scraper.output_file)[0] + ".parquet")
+        if self.metadata:
+            self.sink = scraper.RowSink(sink_path, scraper.info_columns, scraper.output_format, scraper.sink_batch_size)
+            self.done_urls = self.sink.done_urls()
+
+        for stage in self.stages:
+            stage.start()
+
+        stop_event = threading.Event()
+        t = threading.Thread(target=self.display, args=(stop_event,), daemon=True)
+        t.start()
+
+        os.makedirs("./bvid", exist_ok=True)
+        index = bvid.BvIndex(bvid.index_file, on_new=self.feed)
+        try:
+            if resume_pending:
+                self.resume()
+
+            index.import_folder("./bvid")
+            # 搜索线程直接把新 BV 号放入下游队列，不等全部关键词搜完
+            if bvid.search_mode == "http":
+                bvid.crawl_keywords_http(keywords, index)
+            else:
+                bvid.crawl_keywords_selenium(keywords, index=index)
+            safe_print("所有关键词搜索完毕，等待后续阶段处理完成")
+            bvid.write_download_list(index)
+
+        finally:
+            for stage in self.heads:
+                stage.close()
+            index.close()
+            stop_event.set()
+            t.join()
+            if self.sink:
+                self.sink.close()
+            self.session.close()
+
+        safe_print("流水线状态：" + "；".join(stage.line() for stage in self.stages))
+        if self.latencies:
+            safe_print(f"共 {len(self.latencies)} 个视频走完流水线，平均用时 {sum(self.latencies) / len(self.latencies) / 60:.1f} 分钟，"
+                       f"最长 {max(self.latencies) / 60:.1f} 分钟")
+
+
+# ========== 主逻辑 ==========
+if __name__ == "__main__":
+    with open(keywords_file, "r", encoding="utf-8") as f:
+        keywords = [line.strip() for line in f
+                    if line.strip() and not line.startswith("#")]
+
+    if enable_download:
+        print("正在读取COOKIE，请稍等")
+        scraper.cookie_file_path = scraper.get_bilibili_cookies()
+
+    try:
+        Pipeline().run(keywords)
+    finally:
+        if scraper.cookie_file_path and os.path.exists(scraper.cookie_file_path):
+            os.remove(scraper.cookie_file_path)
+            print("临时 cookie 文件已删除")
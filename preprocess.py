@@ -2,11 +2,30 @@ import pandas as pd
 import numpy as np
 import re
 import os
+import tempfile
+from collections import Counter
 
 output_path = "./output/"
-input_file = output_path + "bili.csv"
+input_file = output_path + "bili.csv"   # scraper.py 的输出：bili.csv，或 output_format = "parquet" 时的 bili.parquet 目录
 output_file = output_path + "bili_cleaned.csv"
 
+chunk_size = None   # 分块读取的行数：None 为整表读入内存；数据大于内存时设为如 200000，分两遍流式处理，结果与整表处理相同
+
+count_columns = ['精确播放数', '点赞数', '投硬币枚数', '收藏人数', '转发人数']   # 缺失时填 0 的计数列
+text_columns = ['标题', '标签', '发布时间', '视频简介', '作者简介']          # 分块读取时统一按字符串读入，避免各块推断出不同类型
+scaled_columns = ['视频时长(秒)', '点赞数', '收藏人数']
+# Parquet 输入只读取这些列：final_columns 的来源列，以及用于去重的链接
+input_columns = ['链接', '标题', '标签', '发布时间', '视频时长(秒)'] + count_columns
+
+# 删除中间列（保留清洗后特征）
+final_columns = [
+    'log_播放量',         # 目标变量
+    '点赞率', '收藏率', '转发率',  # 互动特征
+    '视频时长(秒)', '标题长度',    # 内容特征  
+    '发布小时', '是否周末',      # 时间特征
+    '主标签'               # 分类特征
+]
+
 # 创建不存在的目录
 os.makedirs(output_path, exist_ok=True)
 
@@ -20,7 +39,10 @@ def clean_bilibili_data(input_path: str, output_path: str) -> pd.DataFrame:
     4. 数据标准化
     """
     # ========== 1. 数据加载与基础清洗 ==========
-    df = pd.read_csv(input_path, sep=',', encoding='utf-8')
+    if is_parquet(input_path):
+        df = pd.read_parquet(input_path, columns=input_columns)  # 只读需要的列，类型由文件中的 schema 决定
+    else:
+        df = pd.read_csv(input_path, sep=',', encoding='utf-8')
     
     # 1.1 列名标准化（去除空格/特殊字符）
     df.columns = [col.strip().replace('\n', '') for col in df.columns]
@@ -66,7 +88,8 @@ def clean_bilibili_data(input_path: str, output_path: str) -> pd.DataFrame:
     df['互动指数'] = (df['点赞数']*0.4 + df['收藏人数']*0.3 + df['转发人数']*0.3) / df['精确播放数']
     
     # 3.3 文本特征清洗
-    df['视频简介'] = df['视频简介'].apply(lambda x: re.sub(r'[^\w\s]', '', str(x)))  # 去标点
+    if '视频简介' in df.columns:  # Parquet 输入不读取简介
+        df['视频简介'] = df['视频简介'].apply(lambda x: re.sub(r'[^\w\s]', '', str(x)))  # 去标点
     df['标题长度'] = df['标题'].str.len()
     
     # 3.4 分类特征处理
@@ -84,20 +107,172 @@ def clean_bilibili_data(input_path: str, output_path: str) -> pd.DataFrame:
     )
     
     # ========== 5. 保存结果 ==========
-    # 删除中间列（保留清洗后特征）
-    final_columns = [
-        'log_播放量',         # 目标变量
-        '点赞率', '收藏率', '转发率',  # 互动特征
-        '视频时长(秒)', '标题长度',    # 内容特征  
-        '发布小时', '是否周末',      # 时间特征
-        '主标签'               # 分类特征
-    ]
     df = df[final_columns]
     
     df.to_csv(output_path, index=False, encoding='utf-8-sig')
     print(f"清洗完成！最终保留 {len(final_columns)} 个特征，样例数据：\n{df.head(2)}")
     return df
 
+def clean_bilibili_data_chunked(input_path: str, output_path: str, chunksize: int = 200000) -> int:
+    """
+    分块流式清洗，内存占用只与 chunksize 有关，输出与 clean_bilibili_data 相同：
+    第一遍只读时长列，统计中位数（按取值计数，精确）；
+    第二遍按块填充缺失值、去重（记录每行的 64 位哈希）、过滤，累计播放量的均值/方差（3σ 阈值），
+    并把逐行特征写入临时文件（只保留最终特征和需要的原始列）；
+    之后在临时文件上按 3σ 过滤并累计 MinMaxScaler 的最小/最大值，最后逐块标准化并写出
+    :return: 输出行数
+    """
+    from sklearn.preprocessing import MinMaxScaler
+
+    # ========== 第一遍：时长中位数 ==========
+    counts = Counter()
+    for chunk in iter_chunks(input_path, chunksize, ['视频时长(秒)']):
+        counts.update(chunk['视频时长(秒)'].dropna().value_counts().to_dict())
+    duration_median = median_from_counts(counts)
+
+    with tempfile.TemporaryDirectory(prefix="preprocess_") as temp_dir:
+        # ========== 第二遍：填充、去重、过滤、逐行特征 ==========
+        seen = np.empty(0, dtype=np.uint64)  # 已出现行的哈希（有序）
+        play_n, play_mean, play_m2 = 0, 0.0, 0.0
+        parts = []
+        for chunk in iter_chunks(input_path, chunksize):
+            chunk = chunk.astype({c: 'float64' for c in count_columns + ['视频时长(秒)'] if c in chunk.columns})  # 各块类型一致，哈希才可比较
+            chunk.fillna({**{c: 0 for c in count_columns}, '视频时长(秒)': duration_median,
+                          '视频简介': '无简介', '作者简介': '无简介'}, inplace=True)
+
+            # 去重：块内保留第一次出现的行，再去掉之前各块出现过的行
+            hashes = pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+            keep = ~pd.Series(hashes).duplicated().to_numpy()
+            if len(seen):
+                position = np.minimum(np.searchsorted(seen, hashes), len(seen) - 1)
+                keep &= seen[position] != hashes
+            seen = np.union1d(seen, hashes[keep])
+            chunk = chunk[keep]
+
+            chunk = chunk[chunk['精确播放数'] > 0]
+
+            # 合并各块的均值与方差（Chan 并行算法），与整表计算的 3σ 阈值一致
+            plays = chunk['精确播放数'].to_numpy()
+            if len(plays):
+                n, mean = len(plays), plays.mean()
+                m2 = ((plays - mean) ** 2).sum()
+                delta = mean - play_mean
+                total = play_n + n
+                play_mean += delta * n / total
+                play_m2 += m2 + delta ** 2 * play_n * n / total
+                play_n = total
+
+            chunk = chunk[(chunk['视频时长(秒)'] >= 5) & (chunk['视频时长(秒)'] <= 6*3600)]
+            path = os.path.join(temp_dir, f"{len(parts):05d}.pkl")
+            row_features(chunk).to_pickle(path)
+            parts.append(path)
+        del seen
+
+        # ========== 3σ 过滤，累计标准化的最小/最大值 ==========
+        play_limit = play_mean + 3 * np.sqrt(play_m2 / (play_n - 1)) if play_n > 1 else np.nan
+        scaler = MinMaxScaler()
+        has_missing = {'标题长度': False, '发布小时': False}
+        for path in parts:
+            chunk = pd.read_pickle(path)
+            chunk = chunk[chunk['精确播放数'] <= play_limit]
+            if len(chunk):
+                scaler.partial_fit(chunk[scaled_columns])
+            for col in has_missing:
+                has_missing[col] |= bool(chunk[col].isna().any())
+            chunk.to_pickle(path)
+
+        # ========== 标准化并写出 ==========
+        written = 0
+        head = None
+        with open(output_path, 'w', encoding='utf-8-sig', newline='') as f:
+            for path in parts:
+                chunk = pd.read_pickle(path)
+                if len(chunk):
+                    chunk[scaled_columns] = scaler.transform(chunk[scaled_columns])
+                # 整表处理时只要有一个缺失值整列就是浮点数，这里按全部数据统一类型
+                for col, missing in has_missing.items():
+                    if missing:
+                        chunk[col] = chunk[col].astype('float64')
+                chunk = chunk[final_columns]
+                chunk.to_csv(f, index=False, header=written == 0)
+                written += len(chunk)
+                if head is None or len(head) < 2:
+                    head = chunk.head(2) if head is None else pd.concat([head, chunk.head(2 - len(head))])
+
+    print(f"清洗完成！最终保留 {len(final_columns)} 个特征，共 {written} 行，样例数据：\n{head}")
+    return written
+
+
+def is_parquet(path: str) -> bool:
+    return os.path.isdir(path) or path.endswith('.parquet')
+
+
+def iter_chunks(path: str, chunksize: int, columns: list = None):
+    """
+    逐块读取 scraper.py 的输出，列名已标准化
+    :param columns: 只读取这些列；None 时 CSV 读取全部列，Parquet 读取 input_columns
+    """
+    if is_parquet(path):
+        import pyarrow.dataset as ds
+        dataset = ds.dataset(path, format='parquet')
+        for batch in dataset.to_batches(columns=columns or input_columns, batch_size=chunksize):
+            yield batch.to_pandas()
+        return
+
+    # 列名标准化后与原列名对应
+    header = pd.read_csv(path, sep=',', encoding='utf-8', nrows=0).columns
+    raw_names = {col.strip().replace('\n', ''): col for col in header}
+    usecols = [raw_names[c] for c in columns] if columns else None
+    for chunk in pd.read_csv(path, sep=',', encoding='utf-8', chunksize=chunksize, usecols=usecols,
+                             dtype={raw_names[c]: str for c in text_columns if c in raw_names}):
+        chunk.columns = [col.strip().replace('\n', '') for col in chunk.columns]
+        yield chunk
+
+
+def median_from_counts(counts: Counter) -> float:
+    """
+    由取值计数求中位数（偶数个时取中间两个的平均，同 pandas）
+    """
+    total = sum(counts.values())
+    if total == 0:
+        return np.nan
+    middle = [(total - 1) // 2, total // 2]
+    values = []
+    seen = 0
+    for value in sorted(counts):
+        seen += counts[value]
+        while middle and middle[0] < seen:
+            values.append(value)
+            middle.pop(0)
+        if not middle:
+            break
+    return np.mean(values)
+
+
+def row_features(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    只依赖本行的特征（同 clean_bilibili_data 第 3、4.1 步），保留 3σ 过滤和标准化要用的原始列
+    """
+    out = pd.DataFrame(index=df.index)
+    publish_time = pd.to_datetime(df['发布时间'])
+    out['精确播放数'] = df['精确播放数']
+    out['log_播放量'] = np.log1p(df['精确播放数'])
+    out['点赞率'] = df['点赞数'] / df['精确播放数']
+    out['收藏率'] = df['收藏人数'] / df['精确播放数']
+    out['转发率'] = df['转发人数'] / df['精确播放数']
+    out['视频时长(秒)'] = df['视频时长(秒)']
+    out['点赞数'] = df['点赞数']
+    out['收藏人数'] = df['收藏人数']
+    out['标题长度'] = df['标题'].str.len()
+    out['发布小时'] = publish_time.dt.hour
+    out['是否周末'] = publish_time.dt.weekday >= 5
+    out['主标签'] = df['标签'].str.split(',').str[0].fillna('其他')
+    return out
+
+
 # 执行清洗
 if __name__ == "__main__":
-    clean_df = clean_bilibili_data(input_file, output_file)
\ No newline at end of file
+    if chunk_size:
+        clean_bilibili_data_chunked(input_file, output_file, chunk_size)
+    else:
+        clean_df = clean_bilibili_data(input_file, output_file)
\ No newline at end of file
@@ -1,7 +1,11 @@
 import re
 import os
+import csv
+import json
+import html as html_lib
 import time
 import requests
+import shutil
 import tempfile
 import threading
 import subprocess
@@ -9,38 +13,79 @@ import browser_cookie3
 import pandas as pd
 
 from bs4 import BeautifulSoup
-from openpyxl import Workbook
+from page_cache import PageCache
+import downloader
+from state import get_store
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # ========== 配置项 ==========
 print_lock = threading.Lock()
+log_lock = threading.Lock()
 
 video_save_path = "./video/"  # 视频保存目录（仅在下载模式下使用）
 log_save_path = "./log/"
 output_path = "./output/"
 
 input_file = log_save_path + "test.log" # "download_list.log" 
-check_file = log_save_path + "video_list.log"
+check_file = log_save_path + "video_list.log"   # 旧版的已下载记录，首次运行时导入状态库 log/state.db
 error_file = log_save_path + "video_errorlist.log"
 
-log_file1 = log_save_path + "ffmpeg.log"
-log_file2 = log_save_path + "youget.log"
+ffmpeg_path = r"D:\ffmpeg.exe"  # ffmpeg.exe绝对路径
+ffmpeg_log_path = log_save_path + "ffmpeg/"     # 每个合并任务一个日志文件
+merge_mode = "copy"     # "copy"：直接封装音视频流（无损、秒级完成），失败时自动回退重新编码；"encode"：总是用 libx264/aac 重新编码
+merge_workers = 2       # 同时进行的合并任务数
+youget_log_path = log_save_path + "youget/"     # 每个下载任务一个日志文件
+staging_path = video_save_path + ".staging/"    # 每个下载任务一个暂存目录，下载成功后移入 video_save_path
+
+format_cache_file = log_save_path + "format_cache.jsonl"  # 每个 BV 可用清晰度的探测结果
+
+download_backend = "you-get"   # "you-get"：调用 you-get 下载；"native"：内置下载器（多连接分片、可断点续传）
+download_workers = 4    # 同时下载的视频数
+host_concurrency = 4    # 同一主机的最大并发下载数
 
 ioput_file = output_path + "raw.xlsx"
 output_file = output_path + "bili.csv"
+output_format = "csv"   # 流式写入格式："csv" 或 "parquet"（parquet 需要 pyarrow，写入 bili.parquet/ 目录）
+sink_batch_size = 200   # 每攒够多少行写盘一次
+export_xlsx = False     # 爬取完成后是否另存一份 raw.xlsx（需要 openpyxl）
+
+info_columns = ["标题", "链接", "up主", "up主id", "精确播放数", "历史累计弹幕数", "点赞数", "投硬币枚数", "收藏人数", "转发人数",
+                "发布时间", "视频时长(秒)", "视频简介", "作者简介", "标签", "视频aid"]
+
+# Parquet 输出的列类型：计数为 32 位无符号整数，up主 / 标签为字典编码，发布时间为时间戳，未列出的列为字符串
+parquet_column_types = {
+    "up主": "dictionary", "up主id": "dictionary", "标签": "dictionary",
+    "精确播放数": "uint32", "历史累计弹幕数": "uint32", "点赞数": "uint32", "投硬币枚数": "uint32", "收藏人数": "uint32", "转发人数": "uint32",
+    "视频时长(秒)": "int32", "发布时间": "timestamp",
+}
+
+crawl_workers = 8       # 并发爬取信息的线程数（1 为逐个爬取）
+crawl_ordered = True    # True：按输入顺序写入结果；False：谁先完成先写入
+
+cookie_file_path = None  # 由主逻辑生成的临时 cookie 文件
+
+cache_path = "./cache/"          # 视频页面缓存目录
+cache_enabled = True             # 是否缓存视频页面
+cache_ttl = 7 * 24 * 3600        # 缓存过期时间（秒），0 为永不过期
+cache_max_bytes = 2 * 1024 ** 3  # 缓存总大小上限，超出按 LRU 淘汰
+cache_offline = False            # True：只用缓存重新解析，不联网（未命中的视频记为错误）
+
+video_url_base = "https://www.bilibili.com/video/"  # BV号拼接成视频页链接的前缀（压测时可指向本地替身服务器）
 
 # 创建不存在的目录
 os.makedirs(video_save_path, exist_ok=True)
 os.makedirs(log_save_path, exist_ok=True)
 os.makedirs(output_path, exist_ok=True)
-
-if not os.path.exists(check_file):
-    open(check_file, 'a').close()  # 创建空文件
+os.makedirs(youget_log_path, exist_ok=True)
+os.makedirs(ffmpeg_log_path, exist_ok=True)
 
 headers = { "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36", "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7", "Accept-Language": "zh-CN,zh;q=0.9", "Accept-Encoding": "gzip, deflate, br", "Upgrade-Insecure-Requests": "1", "Cache-Control": "max-age=0", }
 
 
 def write_error_log(message):
-    with open(error_file, "a") as file:
+    with log_lock, open(error_file, "a") as file:
         file.write(message + "\n")
 
 def is_url(video_id_or_url):
@@ -50,7 +95,7 @@ def get_video_url(video_id_or_url):
     if is_url(video_id_or_url):
         return video_id_or_url
     else:
-        return f"https://www.bilibili.com/video/{video_id_or_url}"
+        return video_url_base + video_id_or_url
 
 def safe_print(*args, **kwargs):
     with print_lock:
@@ -72,37 +117,55 @@ def loading_dots(stop_event, text="加载中", interval=0.5):
 
 
 # ========== 合并音轨函数 ==========
-def merge_audio_video(video_path, audio_path, output_path):
-    ffmpeg_path = r"D:\ffmpeg.exe"  # ffmpeg.exe绝对路径
-
-    command = [
+def merge_audio_video(video_path, audio_path, output_path, log_path=None, mode=None):
+    '''
+    合并音视频分轨
+    :param log_path: ffmpeg 日志文件，默认按输出文件名写到 ffmpeg_log_path
+    :param mode: "copy" 先尝试直接封装，失败再重新编码；"encode" 直接重新编码
+    :return: 是否合并成功
+    '''
+    mode = mode or merge_mode
+    if log_path is None:
+        log_path = os.path.join(ffmpeg_log_path, os.path.splitext(os.path.basename(output_path))[0] + ".log")
+
+    base_command = [
         ffmpeg_path,
         "-y",
         "-i", video_path,
         "-i", audio_path,
-        "-c:v", "libx264",
-        "-c:a", "aac",
-        output_path
+        "-map", "0:v:0",
+        "-map", "1:a:0",
     ]
-
-    flag = False
-
-    try:
-        # 保存到日志文件
-        with open(log_file1, "w") as f:
-            subprocess.run(command, stdout=f, stderr=f, check=True)
-        safe_print(f"\n合并完成：{output_path}")
-
-        flag = True
-
-    except subprocess.CalledProcessError as e:
-        safe_print(f"\n合并失败：{e}")
-
-    return flag
-
-
-# ========== 文件匹配和批量合并函数 ==========
-def auto_merge_folder(folder_path, id_list, delete_source=True):
+    attempts = []
+    if mode == "copy":
+        attempts.append(("封装", ["-c", "copy", "-movflags", "+faststart"]))
+    attempts.append(("重新编码", ["-c:v", "libx264", "-c:a", "aac"]))
+
+    # 保存到日志文件
+    with open(log_path, "w", encoding="utf-8") as f:
+        for label, codec_args in attempts:
+            try:
+                f.write(f"===== {label} =====\n")
+                f.flush()
+                subprocess.run(base_command + codec_args + [output_path], stdout=f, stderr=f, check=True)
+                safe_print(f"合并完成（{label}）：{output_path}")
+                return True
+
+            except (subprocess.CalledProcessError, OSError) as e:
+                safe_print(f"合并失败（{label}）：{e}")
+
+    if os.path.exists(output_path):
+        os.remove(output_path)
+    return False
+
+
+# ========== 文件匹配和合并函数 ==========
+def auto_merge_folder(folder_path, video_id_or_url, delete_source=True):
+    '''
+    合并一个视频暂存目录里的 [00]/[01] 分轨，输出到 video_save_path，文件名以 BV 号开头
+    暂存目录只包含这一个 BV 的文件，因此按 BV 号配对，不依赖列表顺序
+    :return: 是否全部合并成功
+    '''
     # 文件名匹配形如：名字[00].mp4 和 名字[01].mp4
     pattern_video = re.compile(r"^(.*)\[00\]\.mp4$")
     pattern_audio = re.compile(r"^(.*)\[01\]\.mp4$")
@@ -122,168 +185,736 @@ def auto_merge_folder(folder_path, id_list, delete_source=True):
             base_name = a_match.group(1)
             audio_files[base_name] = f
 
-    # 找到匹配对并合并
-    for video_id_or_url, base_name in zip(id_list, video_files):
-        if base_name in audio_files:
-            video_path = os.path.join(folder_path, video_files[base_name])
-            audio_path = os.path.join(folder_path, audio_files[base_name])
-            output_path = os.path.join(folder_path, video_id_or_url.strip() + "_" + base_name + ".mp4")
+    name = job_name(video_id_or_url)
+    pairs = sorted(base_name for base_name in video_files if base_name in audio_files)
+    if not pairs:
+        safe_print(f"{name} 未找到可合并的音视频分轨：{files}")
+        return False
+
+    # 找到匹配对并合并（分P视频会有多对）
+    all_merged = True
+    for part, base_name in enumerate(pairs, 1):
+        video_path = os.path.join(folder_path, video_files[base_name])
+        audio_path = os.path.join(folder_path, audio_files[base_name])
+        output_path = os.path.join(video_save_path, name + "_" + base_name + ".mp4")
+
+        # 分P视频每一P单独一个日志，后一P的合并不会覆盖前一P的日志
+        log_name = name + (f"_P{part}.log" if len(pairs) > 1 else ".log")
+        flag = merge_audio_video(video_path, audio_path, output_path,
+                                 log_path=os.path.join(ffmpeg_log_path, log_name))
+        all_merged = all_merged and flag
+
+        if flag and delete_source:
+            os.remove(video_path)
+            os.remove(audio_path)
+            safe_print(f"已删除源文件: {video_files[base_name]}, {audio_files[base_name]}")
+
+    if all_merged:
+        # === 在成功合并后记录到状态库 ===
+        get_store().mark(name, "merged")
+        shutil.rmtree(folder_path, ignore_errors=True)
+
+    return all_merged
+
+
+def merge_job(i, video_id_or_url, folder_path, progress):
+    '''
+    合并任务，在下载完成后立即提交，与其他视频的下载同时进行
+    '''
+    try:
+        if auto_merge_folder(folder_path, video_id_or_url, delete_source=True):
+            progress.update(merged=1)
+            return True
+        reason = f"合并失败，分轨保留在 {folder_path}"
+
+    except Exception as e:
+        reason = f"合并出错：{e}"
+
+    write_error_log(f"第{i}个视频{reason}: {video_id_or_url.strip()}")
+    get_store().fail(job_name(video_id_or_url), "merged", reason)
+    progress.update(merge_failed=1)
+    return False
+
+
+# ========== 下载进度 ==========
+class DownloadProgress():
+    '''
+    汇总所有下载任务的状态，由后台线程定时刷新一行进度
+    '''
+
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.running = 0
+        self.merged = 0
+        self.merge_failed = 0
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+
+    def update(self, running=0, done=0, failed=0, merged=0, merge_failed=0):
+        with self.lock:
+            self.running += running
+            self.done += done
+            self.failed += failed
+            self.merged += merged
+            self.merge_failed += merge_failed
+
+    def line(self) -> str:
+        with self.lock:
+            elapsed = int(time.time() - self.start_time)
+            return (f"下载进度：完成 {self.done} / 失败 {self.failed} / 进行中 {self.running} / 共 {self.total}；"
+                    f"合并完成 {self.merged} / 合并失败 {self.merge_failed}，已用时 {elapsed // 60}分{elapsed % 60:02d}秒")
+
+    def display(self, stop_event, interval=2):
+        while not stop_event.wait(interval):
+            safe_print(self.line())
+        safe_print(self.line())
+
+
+# ========== 主机并发限制 ==========
+host_semaphores = {}
+host_semaphores_lock = threading.Lock()
+
+def get_host_semaphore(url):
+    host = urlparse(url).netloc
+    with host_semaphores_lock:
+        if host not in host_semaphores:
+            host_semaphores[host] = threading.BoundedSemaphore(host_concurrency)
+        return host_semaphores[host]
+
+
+def job_name(video_id_or_url):
+    '''
+    下载任务名：优先使用 BV 号，用于暂存目录和日志文件名
+    '''
+    match = re.search(r'(BV[0-9A-Za-z]{10})', video_id_or_url)
+    if match:
+        return match.group(1)
+    return re.sub(r'[^0-9A-Za-z_-]+', '_', video_id_or_url.strip())[-80:]
+
+
+# ========== 清晰度探测 ==========
+format_cache = None
+format_cache_lock = threading.Lock()
+
+def load_format_cache():
+    '''
+    读取清晰度探测缓存（JSON Lines，每行一个 BV，后写的覆盖先写的）
+    '''
+    global format_cache
+    with format_cache_lock:
+        if format_cache is None:
+            format_cache = {}
+            if os.path.exists(format_cache_file):
+                with open(format_cache_file, "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            continue  # 上次中断时写了一半的行
+                        format_cache[entry["id"]] = entry["formats"]
+    return format_cache
+
+
+def save_format_cache(name, formats):
+    with format_cache_lock:
+        if formats is None:
+            format_cache.pop(name, None)
+        else:
+            format_cache[name] = formats
+        with open(format_cache_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"id": name, "formats": formats, "time": int(time.time())}, ensure_ascii=False) + "\n")
+
+
+def probe_formats(url, name, job_log):
+    '''
+    用 you-get --json 查询一次视频的可用格式，结果按 BV 缓存
+    :return: 可用格式列表，探测失败时返回 None
+    '''
+    cache = load_format_cache()
+    if cache.get(name) is not None:
+        return cache[name]
+
+    cmd = ["you-get", "--json"]
+    if cookie_file_path:
+        cmd += ["--cookies", cookie_file_path]
+    cmd.append(url)
 
-            flag = merge_audio_video(video_path, audio_path, output_path)
-            if flag:
-                # === 在成功合并后追加 BV 号到记录文件 ===
-                with open(check_file, "a", encoding="utf-8") as f:
-                    f.write(f"{video_id_or_url}\n")
+    try:
+        with get_host_semaphore(url), open(job_log, "a", encoding="utf-8") as f:
+            f.write(f"===== {time.strftime('%Y-%m-%d %H:%M:%S')} {url} 探测清晰度 =====\n")
+            f.flush()
+            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=f, check=True, timeout=120)
+
+        output = result.stdout.decode("utf-8", errors="replace")
+        info = json.loads(output[output.index("{"):])  # 跳过 JSON 之前的警告输出
+        formats = list(info.get("streams", {}))
+
+    except (subprocess.SubprocessError, OSError, ValueError) as e:
+        safe_print(f"探测清晰度失败: {url} 错误：{e}，改为逐级尝试")
+        return None
+
+    save_format_cache(name, formats)
+    return formats
+
+
+def choose_quality(formats, qualities):
+    '''
+    从可用格式中选出不高于所选清晰度的最高一档
+    :param qualities: 从所选清晰度开始向下的优先级链
+    :return: 格式码，没有合适格式时返回 None
+    '''
+    for q in qualities:
+        if q in formats:
+            return q
+    return None
+
+
+# ========== you-get 下载 ==========
+def download_with_youget(i, url, name, job_dir, job_log, qualities, quality_display_map):
+    '''
+    用 you-get 下载到暂存目录：先探测一次可用格式，直接下载最合适的一档；探测失败时才逐级尝试
+    :return: (是否成功, 最后的错误)
+    '''
+    last_exception = None
+
+    formats = probe_formats(url, name, job_log)
+    if formats is not None:
+        best = choose_quality(formats, qualities)
+        if not best:
+            last_exception = f"没有{quality_display_map.get(qualities[0], qualities[0])}及以下的清晰度，可用格式：{formats}"
+        qualities = [best] if best else []
+
+    for q in qualities:
+        safe_print(f"第{i}个视频 开始下载: {url}, 清晰度: {quality_display_map.get(q, q)}")
+
+        cmd = ["you-get", "--debug", "-o", job_dir]
+        if cookie_file_path:
+            cmd += ["--cookies", cookie_file_path]  # 传入cookie文件
+        if q:
+            cmd += ["--format=" + q]
+        cmd.append(url)
 
+        try:
+            # 保存到该任务自己的日志文件，失败的日志不会被下一个任务覆盖
+            with get_host_semaphore(url), open(job_log, "a", encoding="utf-8") as f:
+                f.write(f"===== {time.strftime('%Y-%m-%d %H:%M:%S')} {url} {q} =====\n")
+                f.flush()
+                subprocess.run(cmd, stdout=f, stderr=f, check=True)
+
+            safe_print(f"第{i}个视频 下载完成: {url}, 清晰度: {quality_display_map.get(q, q)}")
+            return True, None
+
+        except (subprocess.CalledProcessError, OSError) as e:
+            last_exception = e  # 记录异常
+            if formats is not None:
+                save_format_cache(name, None)  # 探测结果可能已过期，下次运行重新探测
+            safe_print(f"第{i}个视频 下载失败 ({quality_display_map.get(q, q)})，尝试更低清晰度...")
+            continue
+
+    return False, last_exception
+
+
+# ========== 单个下载任务 ==========
+def download_to_staging(i, video_id_or_url, qualities, quality_display_map, progress):
+    '''
+    在独立的暂存目录中下载一个视频，日志写入独立文件
+    :param qualities: 依次尝试的清晰度
+    :return: 暂存目录，下载失败时返回 None
+    '''
+    progress.update(running=1)  # 最先计数，之后抛出的异常由 download_video_by_url 统一计为失败
+
+    url = get_video_url(video_id_or_url.strip())
+    name = job_name(video_id_or_url)
+    job_dir = os.path.join(staging_path, name)
+    job_log = os.path.join(youget_log_path, name + ".log")
+    os.makedirs(job_dir, exist_ok=True)
+
+    if download_backend == "native":
+        # 内置下载器自行选择不高于所选清晰度的轨道，未完成的分片下次运行时续传
+        safe_print(f"第{i}个视频 开始下载: {url}, 清晰度: {quality_display_map.get(qualities[0], qualities[0])}")
+        with get_host_semaphore(url):
+            success = downloader.download_dash(url, job_dir, qualities[0], cookie_file_path)
+        last_exception = None if success else "内置下载器下载失败"
+    else:
+        success, last_exception = download_with_youget(i, url, name, job_dir, job_log, qualities, quality_display_map)
 
-            if delete_source:
-                os.remove(video_path)
-                os.remove(audio_path)
-                safe_print(f"已删除源文件: {video_files[base_name]}, {audio_files[base_name]}\n")
+    if success:
+        get_store().mark(name, "downloaded")
+        progress.update(running=-1, done=1)
+        return job_dir
 
+    get_store().fail(name, "downloaded", str(last_exception))
+    write_error_log(f"第{i}个视频下载失败（全部清晰度尝试失败）: {url} 错误：{str(last_exception)} 日志：{job_log}")
+    safe_print(f"第{i}个视频 下载失败（全部清晰度失败），日志：{job_log}")
+    progress.update(running=-1, failed=1)
+    return None
 
-# ========== 下载视频函数 ==========
-def download_video_by_url(id_list, quality="dash-flv720-AVC"): # 默认720p
-
-    # 清晰度优先级链（从高到低）
-    quality_priority = [
-        'dash-hdflv2_4k-HEVC',   # 4k
-        'dash-flv_p60-AVC',      # 1080p 60fps
-        'dash-flv-AVC',          # 1080p
-        'dash-flv720-AVC',       # 720p
-    ]
 
-    # 格式码 -> 显示名称
-    quality_display_map = {
-        'dash-hdflv2_4k-HEVC': '4K',
-        'dash-flv_p60-AVC': '1080P 60fps',
-        'dash-flv-AVC': '1080P',
-        'dash-flv720-AVC': '720P',
-    }
+def download_job(i, video_id_or_url, qualities, quality_display_map, progress, merge_executor):
+    '''
+    下载一个视频，成功后立即提交合并任务
+    :param merge_executor: 合并线程池
+    :return: 合并任务的 Future，下载失败时返回 None
+    '''
+    job_dir = download_to_staging(i, video_id_or_url, qualities, quality_display_map, progress)
+    if job_dir is None:
+        return None
+    return merge_executor.submit(merge_job, i, video_id_or_url, job_dir, progress)
 
 
-    # 从当前选择的清晰度开始向下降级
+# ========== 下载视频函数 ==========
+# 清晰度优先级链（从高到低）
+quality_priority = [
+    'dash-hdflv2_4k-HEVC',   # 4k
+    'dash-flv_p60-AVC',      # 1080p 60fps
+    'dash-flv-AVC',          # 1080p
+    'dash-flv720-AVC',       # 720p
+]
+
+# 格式码 -> 显示名称
+quality_display_map = {
+    'dash-hdflv2_4k-HEVC': '4K',
+    'dash-flv_p60-AVC': '1080P 60fps',
+    'dash-flv-AVC': '1080P',
+    'dash-flv720-AVC': '720P',
+}
+
+
+def quality_chain(quality):
+    '''
+    从所选清晰度开始向下降级的清晰度列表
+    '''
     try_start_index = quality_priority.index(quality)
+    return quality_priority[try_start_index:]
 
 
-    for i, video_id_or_url in enumerate(id_list, 1):
-        url = get_video_url(video_id_or_url.strip())
-        success = False
-        last_exception = None
+def download_video_by_url(id_list, quality="dash-flv720-AVC", workers=download_workers): # 默认720p
 
-        for q in quality_priority[try_start_index:]:         
-            print(f"第{i}个视频 开始下载: {url}, 清晰度: {quality_display_map.get(q, q)}")
+    # 从当前选择的清晰度开始向下降级
+    qualities = quality_chain(quality)
 
-            cmd = ["you-get", "--debug", "-o", video_save_path]
-            if cookie_file_path:
-                cmd += ["--cookies", cookie_file_path]  # 传入cookie文件
-            if quality:
-                cmd += ["--format=" + q]
-            cmd.append(url)
+    progress = DownloadProgress(len(id_list))
+    stop_event = threading.Event()
+    t = threading.Thread(target=progress.display, args=(stop_event,))
+    t.start()  # 启动进度线程
+
+    # 每个视频下载完成后立即在合并线程池中合并，合并与其他视频的下载同时进行
+    with ThreadPoolExecutor(max_workers=max(1, merge_workers)) as merge_executor:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = {executor.submit(download_job, i, video_id_or_url, qualities, quality_display_map,
+                                       progress, merge_executor): (i, video_id_or_url)
+                       for i, video_id_or_url in enumerate(id_list, 1)}
+
+            # 下载任务中未捕获的异常（如暂存目录无法创建）记为下载失败，不能静默丢失
+            for future in as_completed(futures):
+                i, video_id_or_url = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    reason = f"下载出错：{e}"
+                    write_error_log(f"第{i}个视频{reason}: {video_id_or_url.strip()}")
+                    get_store().fail(job_name(video_id_or_url), "downloaded", reason)
+                    safe_print(f"第{i}个视频 {reason}")
+                    progress.update(running=-1, failed=1)
 
-            try:
-                # 保存到日志文件
-                with open(log_file2, "w") as f:
-                    subprocess.run(cmd, stdout=f, stderr=f, check=True)
+    stop_event.set()
+    t.join()
+    print()
 
-                print(f"第{i}个视频 下载完成: {url}, 清晰度: {quality_display_map.get(q, q)}")
 
-                success = True
-                break
+# ========== 连接池会话 ==========
+def create_session(pool_size=crawl_workers):
+    '''
+    创建共享的 keep-alive 会话，连接池大小与并发线程数一致
+    :param pool_size: 连接池大小
+    :return: requests.Session
+    '''
+    session = requests.Session()
+    session.headers.update(headers)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# ========== 页面解析正则（模块级预编译） ==========
+author_id_pattern = re.compile(r'"mid":(\d+)')
+video_aid_pattern = re.compile(r'"aid":(\d+)')
+video_duration_pattern = re.compile(r'"duration":(\d+)')
+
+numbers_pattern = re.compile(
+    r'[\s\S]*?视频播放量 (\d+)、弹幕量 (\d+)、点赞数 (\d+)、投硬币枚数 (\d+)、收藏人数 (\d+)、转发人数 (\d+)')
+author_pattern = re.compile(r"视频作者\s*([^,]+)")
+author_desc_pattern = re.compile(r'作者简介 (.+?),')
+title_suffix_pattern = re.compile(r"_哔哩哔哩_bilibili")
+meta_split_pattern = re.compile(r',\s*')
+
+initial_state_pattern = re.compile(r'window\.__INITIAL_STATE__\s*=\s*')
+title_tag_pattern = re.compile(r'<title[^>]*>(.*?)</title>', re.S | re.I)
+meta_tag_pattern = re.compile(r'<meta\s(?:[^>"\']|"[^"]*"|\'[^\']*\')*>', re.I)
+meta_attr_pattern = re.compile(r'([^\s"\'>/=]+)(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s"\'>]+)))?')
+meta_itemprops = ("keywords", "description", "uploadDate")
+
+json_decoder = json.JSONDecoder()
+
+
+# ========== 组装一行数据 ==========
+def build_video_row(url, title_raw, keywords_content, meta_description, publish_date, author_id, video_aid, video_duration_raw):
+    '''
+    由页面中提取出的原始字段组装一行数据，快速解析和 BeautifulSoup 解析共用
+    :return: 与表头顺序一致的一行数据，未找到播放数据（如分集视频）时返回 None
+    '''
+    numbers = numbers_pattern.findall(meta_description)
+    if not numbers:
+        return None
+    if publish_date is None:
+        raise ValueError("未找到发布时间")
+
+    video_duration = int(video_duration_raw) - 2
+
+    # 提取标题
+    title = title_suffix_pattern.sub("", title_raw).strip()
+
+    # 提取标签
+    content_without_title = keywords_content.replace(title + ',', '')
+    keywords_list = content_without_title.split(',')
+    tags = ",".join(keywords_list[:-4])
+
+    # 提取作者
+    author_search = author_pattern.search(meta_description)
+    if author_search:
+        author = author_search.group(1).strip()
+    else:
+        author = "未找到作者"
 
-            except subprocess.CalledProcessError as e:
-                last_exception = e  # 记录异常
-                print(f"第{i}个视频 下载失败 ({quality_display_map.get(q, q)})，尝试更低清晰度...")
-                continue
+    # 提取作者简介
+    author_desc_match = author_desc_pattern.search(meta_description)
+    if author_desc_match:
+        author_desc = author_desc_match.group(1)
+    else:
+        author_desc = "未找到作者简介"
 
-        if not success:
-            write_error_log(f"第{i}个视频下载失败（全部清晰度尝试失败）: {url} 错误：{str(last_exception)}")
-            print(f"第{i}个视频 下载失败（全部清晰度失败）")
-    
-    print()
-    stop_event = threading.Event()
-    t = threading.Thread(target=loading_dots, args=(stop_event, "开始合并"))
-    t.start()  # 启动动画线程
+    # 提取视频简介
+    meta_parts = meta_split_pattern.split(meta_description)
+    if meta_parts:
+        video_desc = meta_parts[0].strip()
+    else:
+        video_desc = "未找到视频简介"
+
+    views, danmaku, likes, coins, favorites, shares = [int(n) for n in numbers[0]]
+    return [title, url, author, str(author_id), views, danmaku, likes, coins, favorites, shares, publish_date, video_duration, video_desc, author_desc, tags, str(video_aid)]
+
+
+# ========== 快速解析（不构建 DOM 树） ==========
+def parse_video_page_fast(html, url):
+    '''
+    直接定位 __INITIAL_STATE__ JSON 与 <meta itemprop=...> 标签，不构建完整 DOM 树
+    页面结构不符合预期时抛出 ValueError / KeyError，由 parse_video_page 回退到 BeautifulSoup 解析
+    :param html: 页面源码
+    :param url: 视频链接
+    :return: 一行数据或 None
+    '''
+    # 视频 aid、视频时长和作者 id
+    state_match = initial_state_pattern.search(html)
+    if not state_match:
+        raise ValueError("未找到 __INITIAL_STATE__")
+    state, _ = json_decoder.raw_decode(html, state_match.end())
+    video_data = state["videoData"]
+    author_id = video_data["owner"]["mid"]
+    video_aid = video_data["aid"]
+    video_duration_raw = video_data["duration"]
+
+    title_match = title_tag_pattern.search(html)
+    if not title_match:
+        raise ValueError("未找到 <title>")
+    title_raw = html_lib.unescape(title_match.group(1))
+
+    meta = {}
+    for tag_match in meta_tag_pattern.finditer(html):
+        attrs = {}
+        # 逐个切分属性，避免把属性值里的文字误认为属性
+        for attr_match in meta_attr_pattern.finditer(tag_match.group(0), 5):
+            name, double_quoted, single_quoted, bare = attr_match.groups()
+            value = next((v for v in (double_quoted, single_quoted, bare) if v is not None), "")
+            attrs.setdefault(name.lower(), value)
+        itemprop = attrs.get("itemprop")
+        if itemprop in meta_itemprops and itemprop not in meta and "content" in attrs:
+            meta[itemprop] = html_lib.unescape(attrs["content"])
+
+    return build_video_row(url, title_raw, meta["keywords"], meta["description"], meta.get("uploadDate"),
+                           author_id, video_aid, video_duration_raw)
+
+
+# ========== BeautifulSoup 解析（兼容旧页面结构） ==========
+def parse_video_page_soup(html, url):
+    '''
+    构建完整 DOM 树后提取信息，作为快速解析失败时的回退
+    :param html: 页面源码
+    :param url: 视频链接
+    :return: 一行数据或 None
+    '''
+    soup = BeautifulSoup(html, "html.parser")
+
+    # 视频 aid、视频时长和作者 id
+    initial_state_script = soup.find("script", string=re.compile("window.__INITIAL_STATE__"))
+    initial_state_text = initial_state_script.string
+
+    author_id = author_id_pattern.search(initial_state_text).group(1)
+    video_aid = video_aid_pattern.search(initial_state_text).group(1)
+    video_duration_raw = video_duration_pattern.search(initial_state_text).group(1)
+
+    title_raw = soup.find("title").text
+    keywords_content = soup.find("meta", itemprop="keywords")["content"]
+    meta_description = soup.find("meta", itemprop="description")["content"]
+    publish_tag = soup.find("meta", itemprop="uploadDate")
+    publish_date = publish_tag["content"] if publish_tag else None
+
+    return build_video_row(url, title_raw, keywords_content, meta_description, publish_date,
+                           author_id, video_aid, video_duration_raw)
+
+
+# ========== 解析单个视频页面 ==========
+def parse_video_page(html, url):
+    '''
+    从视频页面提取信息，优先使用快速解析，页面结构变化时回退到 BeautifulSoup
+    :param html: 页面源码
+    :param url: 视频链接
+    :return: 与表头顺序一致的一行数据，未找到播放数据（如分集视频）时返回 None
+    '''
+    try:
+        return parse_video_page_fast(html, url)
+    except (ValueError, KeyError, TypeError):
+        return parse_video_page_soup(html, url)
+
+
+# ========== 下载页面（带缓存） ==========
+def fetch_page(session, url, cache=None):
+    '''
+    获取页面源码，优先读取缓存；离线模式下缓存未命中直接报错
+    :param cache: PageCache 对象，None 表示不使用缓存
+    :return: 页面源码
+    '''
+    if cache:
+        html = cache.get(url)
+        if html is not None:
+            return html
+        if cache.offline:
+            raise LookupError(f"离线模式下缓存未命中：{url}")
+
+    response = session.get(url)
+    if response.status_code != 200:
+        raise IOError(f"视频页返回 HTTP {response.status_code}")  # 412/429 限流页不能当作视频页解析
+    if cache:
+        cache.put(url, response.text)
+    return response.text
+
+
+# ========== 爬取单个视频 ==========
+def fetch_video_info(session, i, video_id_or_url, cache=None):
+    '''
+    下载并解析单个视频页面，异常记录到错误日志
+    :return: (序号, 链接, 一行数据或 None)
+    '''
+    url = get_video_url(video_id_or_url.strip())
+    try:
+        html = fetch_page(session, url, cache)
+        row = parse_video_page(html, url)
+        if row:
+            get_store().mark(job_name(video_id_or_url), "metadata")
+            safe_print(f"第{i}行视频{url}已完成爬取")
+        else:
+            get_store().fail(job_name(video_id_or_url), "metadata", "未找到相关数据，可能为分集视频")
+            safe_print(f"第{i}行视频 {url}未找到相关数据，可能为分集视频")
+        return i, url, row
+
+    except Exception as e:
+        get_store().fail(job_name(video_id_or_url), "metadata", str(e))
+        write_error_log(f"第{i}行视频发生错误：{e}")
+        safe_print(f"第{i}行发生错误，已记录到错误日志:出错数据为{video_id_or_url}")
+        return i, url, None
+
+
+def crawl_video_rows(id_list, workers=crawl_workers, ordered=crawl_ordered, cache=None):
+    '''
+    用线程池并发爬取视频信息，所有线程共享一个 keep-alive 会话
+    :param id_list: BV号或链接列表
+    :param workers: 并发线程数
+    :param ordered: True 按输入顺序产出结果，False 按完成顺序产出
+    :param cache: PageCache 对象，None 表示不使用缓存
+    :return: 逐个产出 (序号, 链接, 一行数据或 None)
+    '''
+    workers = max(1, workers)
+    session = create_session(workers)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(fetch_video_info, session, i, video_id_or_url, cache)
+                       for i, video_id_or_url in enumerate(id_list, 1)]
+            for future in (futures if ordered else as_completed(futures)):
+                yield future.result()
+    finally:
+        session.close()
+
+
+# ========== 流式写入 ==========
+class RowSink():
+    '''
+    逐行接收爬取结果，按批追加写入 CSV 或 Parquet，进程中断后已写入的数据不会丢失
+    CSV：单个文件追加写入；Parquet：目录下每批一个 part 文件
+    '''
+
+    def __init__(self, path: str, columns: list, fmt: str = "csv", batch_size: int = 200):
+        self.path = path
+        self.columns = columns
+        self.fmt = fmt
+        self.batch_size = max(1, batch_size)
+        self.buffer = []
+        self.written = 0
+        self.file = None
+        self.writer = None
+
+        if fmt == "csv":
+            self._open_csv()
+        elif fmt == "parquet":
+            os.makedirs(path, exist_ok=True)
+            self.schema = parquet_schema(columns)
+            parts = sorted(f for f in os.listdir(path) if f.endswith(".parquet"))
+            self.part_index = len(parts)
+            if parts:
+                import pyarrow.parquet as pq
+                if not pq.read_schema(os.path.join(path, parts[0])).remove_metadata().equals(self.schema):
+                    print(f"注意：{path} 中已有的 part 文件列类型与当前不同（旧版按数据推断类型），整体读取前请先移走或转换旧文件")
+        else:
+            raise ValueError(f"不支持的输出格式：{fmt}")
+
+    def _open_csv(self):
+        if os.path.exists(self.path):
+            self._truncate_partial_line()
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            self.file = open(self.path, "a", newline="", encoding="utf-8")
+            self.writer = csv.writer(self.file)
+        else:
+            self.file = open(self.path, "w", newline="", encoding="utf-8-sig")
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(self.columns)
+            self.file.flush()
+
+    def _truncate_partial_line(self, window: int = 65536):
+        '''
+        截掉上次中断时写了一半的行（csv 模块以 CRLF 结束每一行）
+        '''
+        with open(self.path, "rb+") as f:
+            end = f.seek(0, os.SEEK_END)
+            pos = end
+            while pos > 0:
+                start = max(0, pos - window)
+                f.seek(start)
+                chunk = f.read(pos - start + 1)  # 多读一个字节，防止 \r\n 被窗口切开
+                index = chunk.rfind(b"\r\n")
+                if index != -1:
+                    f.truncate(start + index + 2)
+                    return
+                pos = start
+            f.truncate(0)
+
+    def done_urls(self) -> set:
+        '''
+        已写入的视频链接，用于断点续爬时跳过
+        '''
+        key = self.columns.index("链接")
+        if self.fmt == "csv":
+            with open(self.path, "r", newline="", encoding="utf-8-sig") as f:
+                reader = csv.reader(f)
+                next(reader, None)  # 跳过表头
+                return {row[key] for row in reader if len(row) > key}
+
+        import pyarrow.parquet as pq
+        done = set()
+        for filename in os.listdir(self.path):
+            if filename.endswith(".parquet"):
+                table = pq.read_table(os.path.join(self.path, filename), columns=["链接"])
+                done.update(table.column("链接").to_pylist())
+        return done
+
+    def append(self, row: list):
+        self.buffer.append(row)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        if self.fmt == "csv":
+            self.writer.writerows(self.buffer)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            df = pd.DataFrame(self.buffer, columns=self.columns)
+            for col in self.columns:
+                if parquet_column_types.get(col) == "timestamp":
+                    df[col] = pd.to_datetime(df[col], errors="coerce")
+                elif parquet_column_types.get(col) in (None, "dictionary"):
+                    df[col] = df[col].mask(df[col] == "")  # 空字符串存为空值，与 CSV 读回时一致
+            table = pa.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+            part_path = os.path.join(self.path, f"part-{self.part_index:05d}.parquet")
+            pq.write_table(table, part_path + ".tmp")
+            os.replace(part_path + ".tmp", part_path)  # 写完整后再改名，避免留下损坏的 part 文件
+            self.part_index += 1
+        self.written += len(self.buffer)
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def parquet_schema(columns: list):
+    '''
+    按 parquet_column_types 生成写入 Parquet 的 schema（所有 part 文件一致，读取时无需推断类型）
+    '''
+    import pyarrow as pa
+    types = {
+        "dictionary": pa.dictionary(pa.int32(), pa.string()),
+        "uint32": pa.uint32(),
+        "int32": pa.int32(),
+        "timestamp": pa.timestamp("ms"),  # Parquet 没有秒精度，写入时也会存为毫秒
+    }
+    return pa.schema([(col, types.get(parquet_column_types.get(col), pa.string())) for col in columns])
 
-    auto_merge_folder(folder_path=video_save_path, id_list=id_list, delete_source=True)
 
-    # 任务完成，停止动画
-    stop_event.set()
-    t.join()
+def export_excel(path: str, xlsx_path: str, fmt: str = "csv"):
+    '''
+    把流式写入的结果另存为 Excel（可选的后处理步骤）
+    '''
+    if fmt == "csv":
+        df = pd.read_csv(path, encoding="utf-8-sig", dtype={"up主id": str, "视频aid": str})
+    else:
+        df = pd.read_parquet(path)
+    df.to_excel(xlsx_path, index=False, engine="openpyxl")
+    print(f"视频信息已另存为 {xlsx_path}")
 
 
 # ========== 爬取信息函数 ==========
-def extract_video_info(id_list, new_wb, new_ws):    
-    for i, video_id_or_url in enumerate(id_list, 1):
-        url = get_video_url(video_id_or_url.strip())
-        try:
-            response = requests.get(url, headers=headers)
-            soup = BeautifulSoup(response.text, "html.parser")
-
-            # 视频 aid、视频时长和作者 id
-            initial_state_script = soup.find("script", string=re.compile("window.__INITIAL_STATE__"))
-            initial_state_text = initial_state_script.string
-
-            author_id_pattern = re.compile(r'"mid":(\d+)')
-            video_aid_pattern = re.compile(r'"aid":(\d+)')
-            video_duration_pattern = re.compile(r'"duration":(\d+)')
-
-            author_id = author_id_pattern.search(initial_state_text).group(1)
-            video_aid = video_aid_pattern.search(initial_state_text).group(1)
-            video_duration_raw = int(video_duration_pattern.search(initial_state_text).group(1))
-            video_duration = video_duration_raw - 2
-
-            # 提取标题
-            title_raw = soup.find("title").text
-            title = re.sub(r"_哔哩哔哩_bilibili", "", title_raw).strip()
-
-            # 提取标签
-            keywords_content = soup.find("meta", itemprop="keywords")["content"]
-            content_without_title = keywords_content.replace(title + ',', '')
-            keywords_list = content_without_title.split(',')
-            tags = ",".join(keywords_list[:-4])
-
-            meta_description = soup.find("meta", itemprop="description")["content"]
-            numbers = re.findall(
-                r'[\s\S]*?视频播放量 (\d+)、弹幕量 (\d+)、点赞数 (\d+)、投硬币枚数 (\d+)、收藏人数 (\d+)、转发人数 (\d+)',
-                meta_description)
-
-            # 提取作者
-            author_search = re.search(r"视频作者\s*([^,]+)", meta_description)
-            if author_search:
-                author = author_search.group(1).strip()
-            else:
-                author = "未找到作者"
-
-            # 提取作者简介
-            author_desc_pattern = re.compile(r'作者简介 (.+?),')
-            author_desc_match = author_desc_pattern.search(meta_description)
-            if author_desc_match:
-                author_desc = author_desc_match.group(1)
-            else:
-                author_desc = "未找到作者简介"
-
-            # 提取视频简介
-            meta_parts = re.split(r',\s*', meta_description)
-            if meta_parts:
-                video_desc = meta_parts[0].strip()
-            else:
-                video_desc = "未找到视频简介"
-
-            if numbers:
-                views, danmaku, likes, coins, favorites, shares = [int(n) for n in numbers[0]]
-                publish_date = soup.find("meta", itemprop="uploadDate")["content"]
-                new_ws.append([title, url, author, author_id, views, danmaku, likes, coins, favorites, shares, publish_date, video_duration, video_desc, author_desc, tags, video_aid])
-                print(f"第{i}行视频{url}已完成爬取")
-            else:
-                print(f"第{i}行视频 {url}未找到相关数据，可能为分集视频")
-
-        except Exception as e:
-            write_error_log(f"第{i}行视频发生错误：{e}")
-            print(f"第{i}行发生错误，已记录到错误日志:出错数据为{video_id_or_url}")
-
-    new_wb.save(ioput_file)
-    print(f"视频信息已保存到 {ioput_file}")
+def extract_video_info(id_list, sink, workers=crawl_workers, ordered=crawl_ordered, cache=None):
+    for i, url, row in crawl_video_rows(id_list, workers, ordered, cache):
+        if row:
+            sink.append(row)
+
+    sink.flush()
+    print(f"视频信息已保存到 {sink.path}，本次新增 {sink.written} 条")
+    if cache:
+        print(cache.stats())
 
 def get_bilibili_cookies():
     # 读取 Chrome 的 Cookies
@@ -319,14 +950,17 @@ def order1():
         'd': 'dash-hdflv2_4k-HEVC',    # 4k
         # 可以根据实际支持的格式添加更多
     }
-    with open(check_file, "r") as file:
-        c_list = file.readlines()
-        c_set = set(c_list)
+    state = get_store()
+    state.import_legacy(check_file, "merged")  # 兼容旧版 video_list.log
+
+    all_list = [v.strip() for v in id_list if v.strip()]
+    state.add_listed(job_name(v) for v in all_list)
 
-    # 过滤掉已经下载过的 BV
-    filtered_list = [bvid for bvid in id_list if bvid not in c_set]
+    # 过滤掉已经下载并合并过的 BV
+    merged = state.done_set("merged")
+    filtered_list = [v for v in all_list if job_name(v) not in merged]
 
-    print(f"共 {len(id_list)} 个待下载，已下载 {len(id_list) - len(filtered_list)} 个，剩余 {len(filtered_list)} 个\n")
+    print(f"共 {len(all_list)} 个待下载，已下载 {len(all_list) - len(filtered_list)} 个，剩余 {len(filtered_list)} 个\n")
 
     if not len(filtered_list) == 0:
         choice3 = input("请选择清晰度: a:720p, b:1080p, c:1080p(60fps), d:4k. 默认 720p : ").strip().lower()
@@ -341,22 +975,23 @@ def order1():
 
 # ========== 爬取信息包裹函数 ==========
 def order2():
-    new_wb = Workbook()
-    new_ws = new_wb.active
-    new_ws.append(
-        ["标题", "链接", "up主", "up主id", "精确播放数", "历史累计弹幕数", "点赞数", "投硬币枚数", "收藏人数", "转发人数",
-        "发布时间", "视频时长(秒)", "视频简介", "作者简介", "标签", "视频aid"])
+    path = output_file if output_format == "csv" else os.path.splitext(output_file)[0] + ".parquet"
 
-    extract_video_info(id_list, new_wb, new_ws)  
+    with RowSink(path, info_columns, output_format, sink_batch_size) as sink:
+        done_urls = sink.done_urls()
 
-    # 读取 xlsx 文件
-    df = pd.read_excel(ioput_file, engine='openpyxl')  # 需要 openpyxl 库
+        # 过滤掉已经爬取过的 BV（断点续爬）
+        all_list = [v.strip() for v in id_list if v.strip()]
+        get_store().add_listed(job_name(v) for v in all_list)
+        filtered_list = [v for v in all_list if get_video_url(v) not in done_urls]
 
-    # 保存为 CSV
-    df.to_csv(output_file, index=False, encoding='utf-8-sig')
-    print(f"视频信息已处理 {output_file}")
+        print(f"共 {len(all_list)} 个待爬取，已爬取 {len(all_list) - len(filtered_list)} 个，剩余 {len(filtered_list)} 个\n")
 
+        cache = PageCache(cache_path, cache_ttl, cache_max_bytes, cache_offline) if cache_enabled or cache_offline else None
+        extract_video_info(filtered_list, sink, cache=cache)
 
+    if export_xlsx:
+        export_excel(path, ioput_file, output_format)
 
 
 # ========== 主逻辑 ==========
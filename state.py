@@ -0,0 +1,174 @@
+import os
+import re
+import time
+import sqlite3
+import threading
+
+
+state_file = "./log/state.db"
+
+bvid_pattern = re.compile(r'(BV[0-9A-Za-z]{10})')
+
+# 流水线各阶段，按先后顺序
+STAGES = ("listed", "metadata", "downloaded", "merged", "watermark_removed")
+
+# 每个阶段的上一阶段（查询“待处理”时以上一阶段完成为前提）
+PREVIOUS_STAGE = {
+    "metadata": "listed",
+    "downloaded": "listed",
+    "merged": "downloaded",
+    "watermark_removed": "merged",
+}
+
+
+class StateStore():
+    '''
+    流水线状态库（SQLite）：记录每个 BV 号在各阶段的状态（done / failed）及失败原因
+    scraper.py 与 video.py 共用，代替 video_list.log / watermark_list.log 等逐行文本文件
+    '''
+
+    def __init__(self, path: str = state_file):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS stages (
+                bvid TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                status TEXT NOT NULL,
+                reason TEXT,
+                updated REAL NOT NULL,
+                PRIMARY KEY (bvid, stage)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_stages_stage ON stages (stage, status, bvid);
+            CREATE TABLE IF NOT EXISTS imports (
+                path TEXT PRIMARY KEY,
+                imported REAL NOT NULL
+            );
+        ''')
+
+    def _set(self, rows):
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO stages (bvid, stage, status, reason, updated) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (bvid, stage) DO UPDATE SET status = excluded.status, "
+                "reason = excluded.reason, updated = excluded.updated", rows)
+
+    def mark(self, bvid: str, stage: str):
+        '''
+        标记某个 BV 号的某阶段已完成
+        '''
+        self._set([(bvid, stage, "done", None, time.time())])
+
+    def mark_many(self, bvids, stage: str):
+        now = time.time()
+        self._set([(bvid, stage, "done", None, now) for bvid in bvids])
+
+    def fail(self, bvid: str, stage: str, reason: str):
+        '''
+        标记某阶段失败并记录原因（已完成的阶段不会被覆盖为失败）
+        '''
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO stages (bvid, stage, status, reason, updated) VALUES (?, ?, 'failed', ?, ?) "
+                "ON CONFLICT (bvid, stage) DO UPDATE SET status = 'failed', reason = excluded.reason, "
+                "updated = excluded.updated WHERE stages.status != 'done'",
+                (bvid, stage, str(reason), time.time()))
+
+    def add_listed(self, bvids):
+        '''
+        登记待处理的 BV 号，已有记录不变
+        '''
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO stages (bvid, stage, status, reason, updated) VALUES (?, 'listed', 'done', NULL, ?)",
+                [(bvid, now) for bvid in bvids])
+
+    def is_done(self, bvid: str, stage: str) -> bool:
+        with self.lock:
+            row = self.conn.execute("SELECT 1 FROM stages WHERE bvid = ? AND stage = ? AND status = 'done'",
+                                    (bvid, stage)).fetchone()
+        return row is not None
+
+    def done_set(self, stage: str) -> set:
+        '''
+        某阶段已完成的全部 BV 号，批量过滤时一次取出
+        '''
+        with self.lock:
+            rows = self.conn.execute("SELECT bvid FROM stages WHERE stage = ? AND status = 'done'", (stage,))
+            return {row[0] for row in rows}
+
+    def pending(self, stage: str) -> list:
+        '''
+        上一阶段已完成、本阶段尚未完成的 BV 号
+        '''
+        previous = PREVIOUS_STAGE.get(stage, "listed")
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT p.bvid FROM stages p WHERE p.stage = ? AND p.status = 'done' AND NOT EXISTS ("
+                "SELECT 1 FROM stages s WHERE s.bvid = p.bvid AND s.stage = ? AND s.status = 'done') "
+                "ORDER BY p.updated", (previous, stage))
+            return [row[0] for row in rows]
+
+    def failures(self, stage: str = None) -> list:
+        '''
+        失败记录：[(BV号, 阶段, 原因)]
+        '''
+        with self.lock:
+            if stage:
+                rows = self.conn.execute("SELECT bvid, stage, reason FROM stages WHERE status = 'failed' AND stage = ?", (stage,))
+            else:
+                rows = self.conn.execute("SELECT bvid, stage, reason FROM stages WHERE status = 'failed'")
+            return rows.fetchall()
+
+    def status(self, bvid: str) -> dict:
+        '''
+        某个 BV 号在各阶段的状态：{阶段: (状态, 原因)}
+        '''
+        with self.lock:
+            rows = self.conn.execute("SELECT stage, status, reason FROM stages WHERE bvid = ?", (bvid,))
+            return {stage: (status, reason) for stage, status, reason in rows}
+
+    def import_legacy(self, path: str, stage: str) -> int:
+        '''
+        一次性导入旧的逐行记录文件（如 video_list.log），每行去掉首尾空白后作为 BV 号
+        同一个文件只导入一次
+        '''
+        if not os.path.exists(path):
+            return 0
+        key = os.path.abspath(path)
+        with self.lock:
+            if self.conn.execute("SELECT 1 FROM imports WHERE path = ?", (key,)).fetchone():
+                return 0
+
+        bvids = set()
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    match = bvid_pattern.search(line)  # 旧文件中可能记录的是完整链接
+                    bvids.add(match.group(1) if match else line)
+        self.mark_many(bvids, stage)
+
+        with self.lock, self.conn:
+            self.conn.execute("INSERT INTO imports VALUES (?, ?)", (key, time.time()))
+        return len(bvids)
+
+    def close(self):
+        self.conn.close()
+
+
+store = None
+store_lock = threading.Lock()
+
+def get_store(path: str = state_file) -> StateStore:
+    '''
+    进程内共享的状态库
+    '''
+    global store
+    with store_lock:
+        if store is None:
+            store = StateStore(path)
+        return store
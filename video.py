@@ -2,30 +2,134 @@ import os
 import re
 import sys
 import cv2
+import csv
+import json
+import time
 import numpy
-from moviepy import editor
+import shutil
+import threading
+import tempfile
+import subprocess
+from functools import lru_cache
+from collections import Counter
+from state import get_store
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+try:
+    from scipy.sparse import csc_matrix
+    from scipy.sparse.linalg import splu
+except ImportError:  # 只用 telea / ns 引擎时不需要 scipy
+    splu = None
 
 
 VIDEO_PATH = './video/'
 OUTPUT_PATH = VIDEO_PATH + 'watermark/'
-TEMP_VIDEO = 'temp.mp4'
+INPAINT_ENGINE = "telea"   # 修复引擎："telea" / "ns"（cv2.inpaint），或 "harmonic"（每个视频预计算一次的调和插值填充算子，需要 scipy）
+INPAINT_RADIUS = 1   # cv2.inpaint 的修复半径
+HARMONIC_DENSE_LIMIT = 4 * 1024 * 1024   # 蒙版像素数 × 边界像素数不超过此值时预先展开为稠密矩阵，逐帧只做一次矩阵乘法
+INPAINT_MARGIN = INPAINT_RADIUS + 2   # 裁剪区域在蒙版外框之外多留的像素，保证与整帧修复的结果逐像素一致
+
+MASK_SAMPLE_COUNT = 5      # 生成水印蒙版时均匀抽取的帧数
+MASK_SAMPLE_KEYFRAMES = True   # 抽帧位置对齐到最近的关键帧（跳转后无需向后解码），需要 ffprobe
+
+# 水印区域：依次尝试 up主 的已保存区域、自动检测（与同分辨率的已保存区域重叠时沿用已保存的区域），都失败时才手动框选（需开启）
+ROI_PROFILE_FILE = "./log/roi_profiles.json"   # 已保存的水印区域
+UPLOADER_INFO_FILE = "./output/bili.csv"       # scraper.py 爬取的视频信息，用于查找视频的 up主id
+WATERMARK_INTERACTIVE = False   # 自动检测失败时是否弹窗手动框选（无界面的服务器上保持 False）
+MIN_MASK_PIXELS = 50            # 蒙版像素少于此数时认为该区域内没有水印
+
+AUTO_SAMPLE_COUNT = 15          # 自动检测时抽取的帧数
+AUTO_STD_THRESHOLD = 12         # 像素亮度在各帧间的标准差低于此值视为静止
+AUTO_CORNER_SIZE = (0.35, 0.2)  # 只在四个角搜索水印，角落区域占画面的宽、高比例
+AUTO_PADDING = 8                # 检测到的区域向外扩展的像素
+
+# 去字幕：字幕带缩小后的二值图没有变化时沿用上一帧的蒙版，字幕带内没有文字时不修复
+SUBTITLE_SIGNATURE_WIDTH = 160   # 比较变化时字幕带缩小到的宽度
+SUBTITLE_CHANGE_RATIO = 0.01     # 缩小图中变化的格子超过此比例才视为字幕变化（0 为任何变化都重新生成蒙版）
+
+FFMPEG_PATH = r"D:\ffmpeg.exe"     # ffmpeg.exe绝对路径（编码输出、拼接分段）
+FFPROBE_PATH = r"D:\ffprobe.exe"   # ffprobe.exe绝对路径（读取关键帧位置）
+
+PARALLEL_SEGMENTS = True                # 长视频按帧区间切分，多进程并行去水印后无损拼接
+SEGMENT_WORKERS = os.cpu_count() or 1   # 并行处理的进程数
+MIN_SEGMENT_FRAMES = 900                # 每段至少多少帧，短视频不切分
+
+# 输出视频的编码参数（处理后的帧以原始 BGR 格式通过管道交给 ffmpeg，音轨直接复制）
+ENCODER_ARGS = ["-c:v", "libx264", "-preset", "veryfast", "-crf", "18", "-pix_fmt", "yuv420p"]
+
+# 多个视频同时处理：每个进程处理一个视频，处理中的文件写在 SCRATCH_PATH，完成后再移入 OUTPUT_PATH
+BATCH_WORKERS = os.cpu_count() or 1         # 同时处理的视频数上限（1 为逐个处理，长视频仍可分段并行）
+BATCH_MEMORY_LIMIT = 8 * 1024 ** 3          # 同时处理的视频预估内存之和的上限（字节）
+JOB_MEMORY_BASE = 256 * 1024 ** 2           # 每个视频的固定内存估计（解码器、ffmpeg 进程等）
+JOB_MEMORY_FRAMES = 48                      # 每个视频同时驻留的帧数估计（解码缓冲、编码器前瞻）
+SCRATCH_PATH = OUTPUT_PATH + '.scratch/'    # 临时文件目录，可改为内存盘（如 /dev/shm/vpt/）减少磁盘读写
 
 log_save_path = "./log/"
-input_file = log_save_path + "video_list.log"
+input_file = log_save_path + "video_list.log"       # 旧版记录文件，首次运行时导入状态库 log/state.db
 check_file = log_save_path + "watermark_list.log"
  
 # 创建不存在的目录
 os.makedirs(VIDEO_PATH, exist_ok=True)
 os.makedirs(log_save_path, exist_ok=True)
 
-if not os.path.exists(check_file):
-    open(check_file, 'a').close()  # 创建空文件
+bvid_pattern = re.compile(r'(BV[0-9A-Za-z]{10})')  # BV号固定11位（BV+10位字符）
+
+
+# ========== ffmpeg 管道编码 ==========
+class FrameEncoder():
+    '''
+    把处理后的帧以原始 BGR 格式写入 ffmpeg 编码进程，只编码一次，不产生临时文件
+    指定 audio_source 时在同一次调用中直接复制原视频的音轨
+    '''
+
+    def __init__(self, output_path: str, fps: float, size: tuple, audio_source: str = None):
+        self.output_path = output_path
+        self.error = None
+        cmd = [FFMPEG_PATH, "-y", "-loglevel", "error",
+               "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{size[0]}x{size[1]}", "-r", str(fps), "-i", "-"]
+        if audio_source:
+            cmd += ["-i", audio_source, "-map", "0:v:0", "-map", "1:a?", "-c:a", "copy"]
+        cmd += ENCODER_ARGS + [output_path]
+
+        self.log = tempfile.TemporaryFile()  # ffmpeg 的错误输出，写文件避免管道写满阻塞
+        self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self.log)
+
+    def write(self, frame: numpy.ndarray):
+        self.process.stdin.write(numpy.ascontiguousarray(frame).data)
+
+    def close(self) -> bool:
+        '''
+        结束输入并等待编码完成
+        :return: 是否编码成功，失败时原因保存在 self.error
+        '''
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass  # ffmpeg 已提前退出
+        returncode = self.process.wait()
+
+        self.log.seek(0)
+        message = self.log.read().decode("utf-8", errors="ignore").strip()
+        self.log.close()
+        if returncode != 0:
+            self.error = message[-500:] or f"ffmpeg 返回 {returncode}"
+            return False
+        return True
+
 
 class WatermarkRemover():
  
-    def __init__(self, threshold: int, kernel_size: int):
+    def __init__(self, threshold: int, kernel_size: int, engine: str = None):
         self.threshold = threshold  # 阈值分割所用阈值
         self.kernel_size = kernel_size  # 膨胀运算核尺寸
+        self.engine = engine or INPAINT_ENGINE  # 修复引擎
+        if self.engine == "harmonic" and splu is None:
+            print("未安装 scipy，harmonic 引擎不可用，改用 telea")
+            self.engine = "telea"
+        self.mask_cache = (None, None)  # (蒙版, 裁剪区域)，同一个视频的蒙版只计算一次外框
+        self.fill_cache = (None, None)  # (蒙版, HarmonicFill)，harmonic 引擎的填充算子每个蒙版只构建一次
+        self.profiles = RoiProfiles(ROI_PROFILE_FILE)
+        self.uploader_cache = (None, {})  # ((文件, 修改时间), {BV号: up主id})
  
  
     #根据用户手动选择的ROI（Region of Interest，感兴趣区域）框选水印或字幕位置。
@@ -94,7 +198,7 @@ class WatermarkRemover():
         roi_img = numpy.zeros((img.shape[0], img.shape[1]), numpy.uint8)
         start_x, end_x = int(roi[1]), int(roi[1] + roi[3])
         start_y, end_y = int(roi[0]), int(roi[0] + roi[2])
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
         roi_img[start_x:end_x, start_y:end_y] = gray[start_x:end_x, start_y:end_y]
  
         # 阈值分割
@@ -102,45 +206,130 @@ class WatermarkRemover():
         return mask
  
     #通过截取视频中多帧图像生成多张水印蒙版，并通过逻辑与计算生成最终的水印蒙版
-    def generate_watermark_mask(self, video_path: str) -> numpy.ndarray:
+    def generate_watermark_mask(self, video_path: str, sample_count: int = None) -> numpy.ndarray:
         '''
-    截取视频中多帧图像生成多张水印蒙版，通过逻辑与计算生成最终水印蒙版
+    跳转到均匀分布的若干帧生成多张水印蒙版，通过逻辑与计算生成最终水印蒙版
+    耗时只与抽帧数有关，与视频长度无关；水印区域由 locate_watermark 自动确定
     :param video_path: 视频文件路径
+    :param sample_count: 抽帧数，默认 MASK_SAMPLE_COUNT
     :return: 水印蒙版
     '''
+        sample_count = sample_count or MASK_SAMPLE_COUNT
         print(f"正在分析视频以生成水印蒙版: {video_path}")
         video = cv2.VideoCapture(video_path)
-        video = cv2.VideoCapture(video_path)
         if not video.isOpened():
             print(f"Error: 无法打开视频文件 '{video_path}'！")
             return None
 
-        for _ in range(5):  # 跳过前5帧,避免黑屏
-            video.read() 
+        fps = video.get(cv2.CAP_PROP_FPS)
+        frame_count = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+        first = min(5, max(frame_count - 1, 0))  # 跳过前5帧,避免黑屏
 
-        success, frame = video.read()
-        if not success or frame is None:
+        grays = read_gray_frames(video, sample_positions(video_path, fps, first, frame_count, sample_count))
+        if not grays:
             print("Error: 无法读取视频帧！")
+            video.release()
             return None
 
+        def read_more():
+            # 自动检测需要更多帧，只在用到时读取
+            if len(grays) >= AUTO_SAMPLE_COUNT:
+                return grays
+            return read_gray_frames(video, sample_positions(video_path, fps, first, frame_count, AUTO_SAMPLE_COUNT)) or grays
 
-        print("请在弹出的窗口中选择水印区域，按 SPACE 或 ENTER 确认")
+        try:
+            roi, mask = self.locate_watermark(video_path, grays, read_more)
+        finally:
+            video.release()
+        if roi is None:
+            return None
 
-        roi = self.select_roi(frame, 'select watermark ROI')
-        mask = numpy.ones((frame.shape[0], frame.shape[1]), numpy.uint8)
-        mask.fill(255)
- 
-        step = video.get(cv2.CAP_PROP_FRAME_COUNT) // 5
-        index = 0
-        while success:
-            if index % step == 0:
-                mask = cv2.bitwise_and(mask, self.generate_single_mask(frame, roi, self.threshold))
-            success, frame = video.read()
-            index += 1
-        video.release()
         print("水印蒙版分析完成！")
-
         return self.dilate_mask(mask)
+
+    def sampled_mask(self, grays: list, roi: list) -> numpy.ndarray:
+        '''
+    各抽样帧在 roi 内的阈值蒙版逐帧逻辑与
+    '''
+        mask = self.generate_single_mask(grays[0], roi, self.threshold)
+        for gray in grays[1:]:
+            mask = cv2.bitwise_and(mask, self.generate_single_mask(gray, roi, self.threshold))
+        return mask
+
+    def locate_watermark(self, video_path: str, grays: list, read_more):
+        '''
+    确定水印区域：up主 的已保存区域 -> 自动检测 -> 手动框选（WATERMARK_INTERACTIVE）
+    同分辨率的已保存区域只在与自动检测结果重叠时沿用（同分辨率的视频水印位置不一定相同）
+    已保存的区域在本视频中没有水印像素时视为不适用
+    :param grays: 抽样帧（灰度）
+    :param read_more: 返回更多抽样帧的函数，供自动检测使用
+    :return: (水印区域, 未膨胀的蒙版)，全部失败时返回 (None, None)
+    '''
+        height, width = grays[0].shape[:2]
+        size = (width, height)
+        bvid = self.extract_bvid(os.path.basename(video_path))
+        uploader_id = self.uploader_id(bvid) if bvid else None
+        uploader_key = f"uploader:{uploader_id}" if uploader_id else None
+        resolution_key = f"resolution:{width}x{height}"
+
+        roi = self.profiles.get(uploader_key, size) if uploader_key else None
+        if roi:
+            mask = self.sampled_mask(grays, roi)
+            if cv2.countNonZero(mask) >= MIN_MASK_PIXELS:
+                print(f"使用已保存的水印区域 {uploader_key}: {roi}")
+                return roi, mask
+
+        source = "auto"
+        roi = detect_watermark_roi(read_more(), self.threshold)
+        stored = self.profiles.get(resolution_key, size)
+        if stored and roi and rois_overlap(stored, roi):
+            mask = self.sampled_mask(grays, stored)
+            if cv2.countNonZero(mask) >= MIN_MASK_PIXELS:
+                print(f"使用已保存的水印区域 {resolution_key}（与自动检测结果重叠）: {stored}")
+                return stored, mask
+        elif stored:
+            print(f"已保存的水印区域 {resolution_key} 与本视频的检测结果不重叠，不复用")
+        mask = self.sampled_mask(grays, roi) if roi else None
+        if mask is None or cv2.countNonZero(mask) < MIN_MASK_PIXELS:
+            if not WATERMARK_INTERACTIVE:
+                print(f"未能自动检测到水印区域: {video_path}")
+                return None, None
+            print("请在弹出的窗口中选择水印区域，按 SPACE 或 ENTER 确认")
+            source = "manual"
+            video = cv2.VideoCapture(video_path)
+            video.set(cv2.CAP_PROP_POS_FRAMES, min(5, max(int(video.get(cv2.CAP_PROP_FRAME_COUNT)) - 1, 0)))
+            success, frame = video.read()
+            video.release()
+            roi = self.select_roi(frame if success else cv2.cvtColor(grays[0], cv2.COLOR_GRAY2BGR), 'select watermark ROI')
+            mask = self.sampled_mask(grays, roi)
+            if cv2.countNonZero(mask) < MIN_MASK_PIXELS:
+                print(f"所选区域内没有水印像素: {video_path}")
+                return None, None
+        else:
+            print(f"自动检测到水印区域: {roi}")
+
+        # 保存供同一 up主、同分辨率的其他视频复用
+        if uploader_key:
+            self.profiles.put(uploader_key, roi, size, source)
+        if not self.profiles.get(resolution_key, size):
+            self.profiles.put(resolution_key, roi, size, source)
+        return roi, mask
+
+    def uploader_id(self, bvid: str):
+        '''
+    从 scraper.py 的输出中查找视频的 up主id，文件有更新时重新读取
+    '''
+        path = UPLOADER_INFO_FILE
+        if not os.path.exists(path):
+            parquet_path = os.path.splitext(path)[0] + ".parquet"
+            path = parquet_path if os.path.isdir(parquet_path) else None
+        if path is None:
+            return None
+
+        mtime = os.path.getmtime(path)
+        if self.uploader_cache[0] != (path, mtime):
+            self.uploader_cache = ((path, mtime), load_uploader_ids(path))
+        return self.uploader_cache[1].get(bvid)
  
     #根据手动选择的ROI区域，在单帧图像中生成字幕的蒙版。
     def generate_subtitle_mask(self, frame: numpy.ndarray, roi: list) -> numpy.ndarray:
@@ -152,48 +341,98 @@ class WatermarkRemover():
     '''
         mask = self.generate_single_mask(frame, [0, roi[1], frame.shape[1], roi[3]], self.threshold)  # 仅使用ROI横坐标区域
         return self.dilate_mask(mask)
- 
-    def inpaint_image(self, img: numpy.ndarray, mask: numpy.ndarray) -> numpy.ndarray:
+
+    def subtitle_band(self, frame: numpy.ndarray, roi: list):
         '''
-    修复图像
-    :param img: 单帧图像
-    :parma mask: 蒙版
-    :return: 修复后图像
+    只对字幕带（ROI 的纵向范围、整行宽度）做灰度与阈值分割，并生成用于比较变化的缩小图
+    :return: (字幕带二值图, 缩小图)
     '''
-        telea = cv2.inpaint(img, mask, 1, cv2.INPAINT_TELEA)
-        return telea
- 
+        y0, y1 = max(int(roi[1]), 0), min(int(roi[1] + roi[3]), frame.shape[0])
+        gray = cv2.cvtColor(frame[y0:y1], cv2.COLOR_BGR2GRAY)
+        _, band = cv2.threshold(gray, self.threshold, 255, cv2.THRESH_BINARY)
+
+        small_w = min(SUBTITLE_SIGNATURE_WIDTH, band.shape[1])
+        small_h = max(1, band.shape[0] * small_w // max(band.shape[1], 1))
+        signature = cv2.resize(band, (small_w, small_h), interpolation=cv2.INTER_AREA) > 0  # 格子内有文字像素即为 True
+        return band, signature
+
+    def subtitle_mask_from_band(self, band: numpy.ndarray, roi: list, shape: tuple) -> numpy.ndarray:
+        '''
+    把字幕带二值图放回整帧大小并膨胀，结果与 generate_subtitle_mask 相同，但只在字幕带附近做膨胀
+    '''
+        y0 = max(int(roi[1]), 0)
+        mask = numpy.zeros(shape[:2], numpy.uint8)
+        pad = self.kernel_size
+        top, bottom = max(y0 - pad, 0), min(y0 + band.shape[0] + pad, shape[0])
+        mask[y0:y0 + band.shape[0]] = band
+        mask[top:bottom] = self.dilate_mask(mask[top:bottom])
+        return mask
  
-    def merge_audio(self, input_path: str, output_path: str, temp_path: str):
+    def prepare_mask(self, mask: numpy.ndarray):
         '''
-    合并音频与处理后视频
-    :param input_path: 原视频文件路径
-    :param output_path: 封装音视频后文件路径
-    :param temp_path: 无声视频文件路径
+    计算蒙版非零区域的外框（加上 INPAINT_MARGIN），按蒙版对象缓存，逐帧调用时只在换视频后重新计算
+    :param mask: 蒙版
+    :return: (y0, y1, x0, x1, 裁剪后的蒙版)，蒙版为空时返回 None
     '''
-        print(f"正在合并音频: {input_path} -> {output_path}")
+        cached_mask, region = self.mask_cache
+        if cached_mask is mask:
+            return region
 
-        flag = False
+        points = cv2.findNonZero(mask)
+        if points is None:
+            region = None
+        else:
+            x, y, w, h = cv2.boundingRect(points)
+            y0, y1 = max(y - INPAINT_MARGIN, 0), min(y + h + INPAINT_MARGIN, mask.shape[0])
+            x0, x1 = max(x - INPAINT_MARGIN, 0), min(x + w + INPAINT_MARGIN, mask.shape[1])
+            region = (y0, y1, x0, x1, numpy.ascontiguousarray(mask[y0:y1, x0:x1]))
 
-        try:
-            with editor.VideoFileClip(input_path) as video:
-                audio = video.audio
-                with editor.VideoFileClip(temp_path) as opencv_video:
-                    clip = opencv_video.set_audio(audio)
-                    clip.to_videofile(output_path)
-            print(f"音视频合并成功: {output_path}")
-            
-            flag = True
+        self.mask_cache = (mask, region)
+        return region
 
-        except Exception as e:
-            print(f"合并音频失败: {e}")
+    def fill_operator(self, mask: numpy.ndarray, sub_mask: numpy.ndarray):
+        '''
+    harmonic 引擎的填充算子，按蒙版对象缓存；构建失败时返回 None
+    '''
+        cached_mask, operator = self.fill_cache
+        if cached_mask is mask:
+            return operator
+        try:
+            operator = HarmonicFill(sub_mask)
+        except RuntimeError as e:  # 蒙版占满裁剪区域等情况下方程无解
+            print(f"无法构建填充算子（{e}），改用 telea")
+            operator = None
+        self.fill_cache = (mask, operator)
+        return operator
 
-        return flag
+    def inpaint_image(self, img: numpy.ndarray, mask: numpy.ndarray) -> numpy.ndarray:
+        '''
+    修复图像：只修复蒙版外框内的子图并原地写回，结果与整帧修复相同
+    :param img: 单帧图像（会被原地修改）
+    :parma mask: 蒙版
+    :return: 修复后图像
+    '''
+        region = self.prepare_mask(mask)
+        if region is None:
+            return img  # 蒙版为空，无需修复
 
+        y0, y1, x0, x1, sub_mask = region
+        if self.engine == "harmonic":
+            operator = self.fill_operator(mask, sub_mask)
+            if operator is not None:
+                operator.apply(img[y0:y1, x0:x1])
+                return img
 
+        flags = cv2.INPAINT_NS if self.engine == "ns" else cv2.INPAINT_TELEA
+        img[y0:y1, x0:x1] = cv2.inpaint(img[y0:y1, x0:x1], sub_mask, INPAINT_RADIUS, flags)
+        return img
+ 
+ 
     def remove_video_watermark(self, id_list, filtered_list):
         '''
     去除视频水印
+    :param id_list: 已下载合并的 BV 号
+    :param filtered_list: 其中尚未去水印的 BV 号，只处理文件名中含这些 BV 号的视频
     '''
         if not os.path.exists(OUTPUT_PATH):
             os.makedirs(OUTPUT_PATH)
@@ -222,70 +461,191 @@ class WatermarkRemover():
         print(f"找到 {len(filenames)} 个视频文件:")
         for name in filenames:
             print(f"  - {name}")
-        mask = None
-        
-        skip_count = len(id_list) - len(filtered_list)
 
-        skip_indices = range(0, skip_count)  # 跳过前skip_count个
+        pending = set(filtered_list)
+        state = get_store()
 
-        for i, name in enumerate(filenames):
-            if i in skip_indices:
-                continue  # 跳过本次循环
+        jobs = [(name, self.extract_bvid(name)) for name in filenames]
+        jobs = [(name, bvid) for name, bvid in jobs if bvid in pending]  # 跳过已去水印，或文件名中没有 BV 号的视频
 
-            print(f"\n正在处理视频 ({i+1}/{len(filenames)}): {name}")
-  
-            # 生成水印蒙版
-            mask = self.generate_watermark_mask(name)
-            if mask is None:
-                print(f"无法为视频 {name} 生成水印遮罩，跳过")
-                continue
+        # 多个视频时每个进程处理一个视频；需要弹窗框选时只能在主进程中逐个处理
+        if BATCH_WORKERS > 1 and len(jobs) > 1 and not WATERMARK_INTERACTIVE:
+            self.remove_watermark_batch(jobs)
+            return None
 
-            # 创建待写入文件对象
-            video = cv2.VideoCapture(name)
-            if not video.isOpened():
-                print(f"Error: 无法打开视频文件 '{name}'！")
-                continue
+        results = PartResults(jobs, state)
+        for i, (name, bvid) in enumerate(jobs):
+            print(f"\n正在处理视频 ({i+1}/{len(jobs)}): {name}")
 
-            fps = video.get(cv2.CAP_PROP_FPS)
-            frame_count = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
-            size = (int(video.get(cv2.CAP_PROP_FRAME_WIDTH)), int(video.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+            # === 该 BV 号的所有视频文件都处理完后记录到状态库 ===
+            results.record(bvid, self.remove_watermark_file(name))
 
-            print(f"视频信息: {fps} FPS, {frame_count} 帧, 分辨率: {size[0]}x{size[1]}")
 
-            video_writer = cv2.VideoWriter(TEMP_VIDEO, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
-            if not video_writer.isOpened():
-                print(f"Error: 无法创建输出视频文件 '{TEMP_VIDEO}'！")
-                video.release()
-                continue
+    def remove_watermark_batch(self, jobs: list):
+        '''
+    多进程同时处理多个视频，每个进程一次处理一个视频（不再分段）
+    同时处理的视频数不超过 BATCH_WORKERS，预估内存之和不超过 BATCH_MEMORY_LIMIT（单个视频超出上限时单独处理）
+    状态库只在主进程中更新
+    :param jobs: [(视频文件路径, BV号)]
+    '''
+        results = PartResults(jobs, get_store())
+        running = {}  # future -> (视频文件路径, BV号, 预估内存)
+        used = 0
+        finished = 0
+        print(f"\n批量处理 {len(jobs)} 个视频：最多 {BATCH_WORKERS} 个进程，内存上限 {BATCH_MEMORY_LIMIT / 1024 ** 3:.1f} GB")
 
- 
-            # 逐帧处理图像
-            success, frame = video.read()
- 
+        def collect(futures):
+            nonlocal used, finished
+            for future in futures:
+                name, bvid, estimate = running.pop(future)
+                used -= estimate
+                finished += 1
+                try:
+                    error = future.result()
+                except Exception as e:
+                    error = str(e)
+                if error is None:
+                    print(f"({finished}/{len(jobs)}) 已完成: {name}")
+                else:
+                    print(f"({finished}/{len(jobs)}) 处理失败: {name}，原因：{error}")
+                # === 该 BV 号的所有视频文件都处理完后记录到状态库 ===
+                results.record(bvid, error)
+
+        with ProcessPoolExecutor(max_workers=min(BATCH_WORKERS, len(jobs)), initializer=init_batch_worker,
+                                 initargs=(self.threshold, self.kernel_size, self.engine)) as executor:
+            for name, bvid in jobs:
+                estimate = estimate_job_memory(name)
+                # 进程数或内存已满时，等有视频处理完再提交
+                while running and (len(running) >= BATCH_WORKERS or used + estimate > BATCH_MEMORY_LIMIT):
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    collect(done)
+                print(f"开始处理: {name}（预估内存 {estimate / 1024 ** 2:.0f} MB）")
+                running[executor.submit(process_video, name)] = (name, bvid, estimate)
+                used += estimate
+
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                collect(done)
+
+
+    def remove_watermark_file(self, name: str, segments: bool = True):
+        '''
+    去除单个视频的水印（保留原音轨）：先写到 SCRATCH_PATH 下本任务独占的临时目录，完成后移入 OUTPUT_PATH
+    :param name: 视频文件路径
+    :param segments: 长视频是否分段并行处理（批量模式下每个进程已各处理一个视频，不再分段）
+    :return: 失败原因，成功时返回 None
+    '''
+        os.makedirs(OUTPUT_PATH, exist_ok=True)
+        os.makedirs(SCRATCH_PATH, exist_ok=True)
+        (_, filename) = os.path.split(name)
+        output_path = os.path.join(OUTPUT_PATH, filename.split('.')[0] + '_no_watermark.mp4')  # 输出文件路径
+
+        # 生成水印蒙版
+        mask = self.generate_watermark_mask(name)
+        if mask is None:
+            print(f"无法为视频 {name} 生成水印遮罩，跳过")
+            return "无法生成水印遮罩"
+
+        # 同名视频可能被多个进程同时处理，临时目录各不相同
+        job_dir = tempfile.mkdtemp(prefix=filename.split('.')[0] + '_', dir=SCRATCH_PATH)
+        scratch_path = os.path.join(job_dir, os.path.basename(output_path))
+        try:
+            error = self.render_without_watermark(name, mask, scratch_path, segments)
+            if error is not None:
+                return error
+            try:
+                move_into_place(scratch_path, output_path)
+            except OSError as e:
+                print(f"移动输出视频失败: {e}")
+                return "移动输出视频失败"
+            print(f"输出视频已保存: {output_path}")
+            return None
+        finally:
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+
+    def render_without_watermark(self, name: str, mask: numpy.ndarray, output_path: str, segments: bool = True):
+        '''
+    逐帧（或分段并行）修复蒙版区域，编码写入 output_path
+    :return: 失败原因，成功时返回 None
+    '''
+        # 创建待写入文件对象
+        video = cv2.VideoCapture(name)
+        if not video.isOpened():
+            print(f"Error: 无法打开视频文件 '{name}'！")
+            return "无法打开视频文件"
+
+        fps = video.get(cv2.CAP_PROP_FPS)
+        frame_count = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+        size = (int(video.get(cv2.CAP_PROP_FRAME_WIDTH)), int(video.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+
+        print(f"视频信息: {fps} FPS, {frame_count} 帧, 分辨率: {size[0]}x{size[1]}")
+
+        if segments and PARALLEL_SEGMENTS and SEGMENT_WORKERS > 1 and frame_count >= 2 * MIN_SEGMENT_FRAMES:
+            video.release()
+            error = self.remove_watermark_segments(name, mask, fps, size, frame_count, output_path)
+            if error is None:
+                return None
+            print(f"分段并行处理失败：{error}，改为逐帧处理")
+            video = cv2.VideoCapture(name)
+
+        try:
+            encoder = FrameEncoder(output_path, fps, size, audio_source=name)
+        except OSError as e:
+            print(f"Error: 无法启动 ffmpeg：{e}")
+            video.release()
+            return "无法启动 ffmpeg"
+
+        # 逐帧处理图像，直接写入编码进程
+        success, frame = video.read()
+        try:
             while success:
-                frame = self.inpaint_image(frame, mask)
-                video_writer.write(frame)
+                encoder.write(self.inpaint_image(frame, mask))
                 success, frame = video.read()
- 
-            video.release()
-            video_writer.release()
- 
-            # 封装视频
-            (_, filename) = os.path.split(name)
-            output_path = os.path.join(OUTPUT_PATH, filename.split('.')[0] + '_no_watermark.mp4')  # 输出文件路径
-            print(f"正在合并音频...")
+        except OSError:
+            pass  # ffmpeg 提前退出，原因见 encoder.error
+        video.release()
 
-            flag = self.merge_audio(name, output_path, TEMP_VIDEO)
-            # === 在成功合并后追加 BV 号到记录文件 ===
-            if flag:
-                with open(check_file, "a", encoding="utf-8") as f:
-                    f.write(f"{self.extract_bvid(name)}\n")
+        if not encoder.close():
+            print(f"编码输出视频失败: {encoder.error}")
+            return "编码输出视频失败"
+        return None
 
-            print(f"输出视频已保存: {output_path}")
  
-        if os.path.exists(TEMP_VIDEO):
-            os.remove(TEMP_VIDEO)
-            print("临时文件已清理")
+    def remove_watermark_segments(self, name: str, mask: numpy.ndarray, fps: float, size: tuple, frame_count: int, output_path: str):
+        '''
+    把视频按帧区间（尽量对齐关键帧）切分，多进程并行去水印，各段编码后与原音轨一起无损拼接为 output_path
+    :param mask: 预先计算好的水印蒙版，各进程共用
+    :return: 失败原因，成功时返回 None
+    '''
+        parts = min(SEGMENT_WORKERS, frame_count // MIN_SEGMENT_FRAMES)
+        segments = plan_segments(frame_count, parts, probe_keyframes(name, fps))
+        segment_dir = output_path + ".segments"
+        os.makedirs(segment_dir, exist_ok=True)
+        segment_paths = [os.path.join(segment_dir, f"{index:04d}.mp4") for index in range(len(segments))]
+        print(f"分 {len(segments)} 段并行处理（{SEGMENT_WORKERS} 个进程）")
+
+        try:
+            with ProcessPoolExecutor(max_workers=min(SEGMENT_WORKERS, len(segments)), initializer=init_segment_worker,
+                                     initargs=(self.threshold, self.kernel_size, self.engine, mask)) as executor:
+                futures = [executor.submit(process_segment, name, start, end, path, fps, size)
+                           for (start, end), path in zip(segments, segment_paths)]
+                counts = [future.result() for future in futures]
+
+            # 除最后一段读到文件末尾外，每段都必须读满
+            for (start, end), count in zip(segments, counts):
+                if end is not None and count != end - start:
+                    return f"第 {start}-{end} 帧只读到 {count} 帧"
+
+            if not concat_segments(segment_paths, output_path, audio_source=name):
+                return "拼接分段失败"
+            return None
+
+        except Exception as e:
+            return str(e)
+
+        finally:
+            shutil.rmtree(segment_dir, ignore_errors=True)
 
  
     def remove_video_subtitle(self):
@@ -311,30 +671,41 @@ class WatermarkRemover():
             video = cv2.VideoCapture(name)
             fps = video.get(cv2.CAP_PROP_FPS)
             size = (int(video.get(cv2.CAP_PROP_FRAME_WIDTH)), int(video.get(cv2.CAP_PROP_FRAME_HEIGHT)))
-            video_writer = cv2.VideoWriter(TEMP_VIDEO, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+            (_, filename) = os.path.split(name)
+            output_path = os.path.join(OUTPUT_PATH, filename.split('.')[0] + '_no_sub.mp4')  # 输出文件路径
+            encoder = FrameEncoder(output_path, fps, size, audio_source=name)
  
             # 逐帧处理图像
             success, frame = video.read()
             if i == 0:
                 roi = self.select_roi(frame, 'select subtitle ROI')
  
-            while success:
-                mask = self.generate_subtitle_mask(frame, roi)
-                frame = self.inpaint_image(frame, mask)
-                video_writer.write(frame)
-                success, frame = video.read()
+            mask, signature = None, None
+            changes, skipped = 0, 0
+            try:
+                while success:
+                    band, current = self.subtitle_band(frame, roi)
+                    # 字幕带有变化时才重新生成蒙版，否则沿用同一个蒙版对象（修复区域也无需重新计算）
+                    if signature is None or numpy.count_nonzero(current != signature) > SUBTITLE_CHANGE_RATIO * current.size:
+                        signature = current
+                        changes += 1
+                        has_text = cv2.countNonZero(band) >= MIN_MASK_PIXELS
+                        mask = self.subtitle_mask_from_band(band, roi, frame.shape) if has_text else None
+
+                    if mask is None:
+                        skipped += 1  # 字幕带内没有文字，原样输出
+                        encoder.write(frame)
+                    else:
+                        encoder.write(self.inpaint_image(frame, mask))
+                    success, frame = video.read()
+            except OSError:
+                pass  # ffmpeg 提前退出，原因见 encoder.error
  
             video.release()
-            video_writer.release()
- 
-            # 封装视频
-            (_, filename) = os.path.split(name)
-            output_path = os.path.join(OUTPUT_PATH, filename.split('.')[0] + '_no_sub.mp4')  # 输出文件路径
-            self.merge_audio(name, output_path, TEMP_VIDEO)
- 
-        if os.path.exists(TEMP_VIDEO):
-            os.remove(TEMP_VIDEO)
-            print("临时文件已清理")
+            if not encoder.close():
+                print(f"编码输出视频失败: {encoder.error}")
+            else:
+                print(f"输出视频已保存: {output_path}（字幕变化 {changes} 次，无字幕帧 {skipped} 帧）")
         
 
     def extract_bvid(self, filename):
@@ -345,25 +716,424 @@ class WatermarkRemover():
       - "BV1xx411x7xx_标题.mp4"
       - "前缀_BV1xx411x7xx_后缀.mp4"
     '''
-        pattern = re.compile(r'(BV[0-9A-Za-z]{10})')  # BV号固定11位（BV+10位字符）
-        match = pattern.search(filename)
+        match = bvid_pattern.search(filename)
         return match.group(1) if match else None
 
  
+# ========== 调和插值填充 ==========
+class HarmonicFill():
+    '''
+    静态蒙版的填充算子：蒙版内每个像素取上下左右四邻的平均（离散拉普拉斯方程），蒙版外紧邻的一圈已知像素为边界条件
+    方程 A·u = B·边界 只与蒙版有关，每个视频分解一次；逐帧只需取出边界像素做一次矩阵乘法（或用分解结果回代）
+    '''
+
+    def __init__(self, mask: numpy.ndarray):
+        height, width = mask.shape[:2]
+        inside = mask > 0
+        self.ys, self.xs = numpy.nonzero(inside)
+        count = len(self.ys)
+        index = numpy.full((height, width), -1, numpy.int64)
+        index[self.ys, self.xs] = numpy.arange(count)
+
+        degree = numpy.zeros(count)
+        rows, cols, known_rows, known_pixels = [], [], [], []
+        for dy, dx in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+            ny, nx = self.ys + dy, self.xs + dx
+            valid = (ny >= 0) & (ny < height) & (nx >= 0) & (nx < width)  # 画面边缘的像素只用画面内的邻居
+            degree += valid
+            ids = numpy.nonzero(valid)[0]
+            neighbor = index[ny[ids], nx[ids]]
+            rows.append(ids[neighbor >= 0])
+            cols.append(neighbor[neighbor >= 0])
+            known_rows.append(ids[neighbor < 0])
+            known_pixels.append(ny[ids][neighbor < 0] * width + nx[ids][neighbor < 0])
+
+        rows, cols = numpy.concatenate(rows), numpy.concatenate(cols)
+        known_rows, known_pixels = numpy.concatenate(known_rows), numpy.concatenate(known_pixels)
+        if len(known_pixels) == 0:
+            raise RuntimeError("蒙版周围没有已知像素")
+
+        # 边界像素去重，B 把边界像素映射到方程右端
+        boundary, known_cols = numpy.unique(known_pixels, return_inverse=True)
+        self.by, self.bx = boundary // width, boundary % width
+
+        a = csc_matrix((numpy.concatenate([degree, -numpy.ones(len(rows))]),
+                        (numpy.concatenate([numpy.arange(count), rows]), numpy.concatenate([numpy.arange(count), cols]))),
+                       shape=(count, count))
+        b = csc_matrix((numpy.ones(len(known_rows)), (known_rows, known_cols)), shape=(count, len(boundary)))
+        lu = splu(a, permc_spec="MMD_AT_PLUS_A", options={"SymmetricMode": True})  # A 对称，填充更少；奇异时抛出 RuntimeError
+
+        if count * len(boundary) <= HARMONIC_DENSE_LIMIT:
+            self.dense = lu.solve(b.toarray()).astype(numpy.float32)  # 蒙版像素 = dense · 边界像素
+            self.lu, self.b = None, None
+        else:
+            self.dense = None
+            self.lu, self.b = lu, b.tocsr()
+
+    def apply(self, img: numpy.ndarray):
+        '''
+        原地填充 img（与构建时的蒙版同尺寸，可以是整帧中的一个视图）
+        '''
+        known = img[self.by, self.bx].astype(numpy.float32)
+        if self.dense is not None:
+            values = self.dense @ known
+        else:
+            values = self.lu.solve(self.b @ known.astype(numpy.float64))
+        img[self.ys, self.xs] = numpy.clip(numpy.rint(values), 0, 255).astype(img.dtype)
+
+
+# ========== 状态记录 ==========
+class PartResults():
+    '''
+    分P视频的一个 BV 号对应多个视频文件：该 BV 号的文件全部处理完后才更新状态库
+    全部成功才标记为完成，否则记录第一个失败原因（状态库不会把已完成改回失败，不能逐个文件标记）
+    '''
+
+    def __init__(self, jobs: list, state):
+        '''
+        :param jobs: [(视频文件路径, BV号)]
+        '''
+        self.state = state
+        self.remaining = Counter(bvid for _, bvid in jobs)
+        self.errors = {}
+
+    def record(self, bvid: str, error):
+        '''
+        :param error: 该文件的失败原因，成功时为 None
+        '''
+        if error is not None:
+            self.errors.setdefault(bvid, error)
+        self.remaining[bvid] -= 1
+        if self.remaining[bvid] > 0:
+            return
+        if bvid in self.errors:
+            self.state.fail(bvid, "watermark_removed", self.errors[bvid])
+        else:
+            self.state.mark(bvid, "watermark_removed")
+
+
+# ========== 水印区域 ==========
+class RoiProfiles():
+    '''
+    按 up主（uploader:{up主id}）或分辨率（resolution:{宽}x{高}）保存的水印区域，存放在 ROI_PROFILE_FILE
+    '''
+
+    def __init__(self, path: str = ROI_PROFILE_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.profiles = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.profiles = json.load(f)
+            except ValueError:
+                print(f"水印区域文件损坏，已忽略: {path}")
+
+    def get(self, key: str, size: tuple):
+        '''
+        :param size: 当前视频的 (宽, 高)，与保存时不同则按比例缩放
+        :return: 水印区域 [x, y, w, h]，没有时返回 None
+        '''
+        with self.lock:
+            profile = self.profiles.get(key)
+        if not profile:
+            return None
+        sx, sy = size[0] / profile["size"][0], size[1] / profile["size"][1]
+        x, y, w, h = profile["roi"]
+        return [int(x * sx), int(y * sy), int(round(w * sx)), int(round(h * sy))]
+
+    def put(self, key: str, roi: list, size: tuple, source: str):
+        '''
+        先合并文件中其他进程（批量处理）已保存的区域，再写回
+        '''
+        with self.lock:
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        self.profiles = {**json.load(f), **self.profiles}
+                except ValueError:
+                    pass
+            self.profiles[key] = {"roi": [int(v) for v in roi], "size": list(size), "source": source, "updated": time.time()}
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.profiles, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+def load_uploader_ids(path: str) -> dict:
+    '''
+    读取 scraper.py 输出的视频信息（bili.csv 或 bili.parquet 目录）
+    :return: {BV号: up主id}
+    '''
+    if os.path.isdir(path):
+        import pandas as pd
+        return collect_uploader_ids(pd.read_parquet(path, columns=["链接", "up主id"]).itertuples(index=False))
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        return collect_uploader_ids((row.get("链接"), row.get("up主id")) for row in csv.DictReader(f))
+
+
+def collect_uploader_ids(rows) -> dict:
+    '''
+    :param rows: (链接, up主id) 序列
+    :return: {BV号: up主id}
+    '''
+    ids = {}
+    for url, uploader in rows:
+        match = bvid_pattern.search(str(url or ""))
+        if match and uploader not in (None, ""):
+            ids[match.group(1)] = str(uploader)
+    return ids
+
+
+def read_gray_frames(video, positions: list) -> list:
+    '''
+    跳转到各帧序号读取灰度帧
+    '''
+    grays = []
+    for position in positions:
+        video.set(cv2.CAP_PROP_POS_FRAMES, position)
+        success, frame = video.read()
+        if success:
+            grays.append(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+    return grays
+
+
+def detect_watermark_roi(grays: list, threshold: int):
+    '''
+    自动检测水印：水印是叠加在画面上的静止亮色像素，各帧间的亮度中位数高、标准差低
+    只在画面四角搜索，取静止亮像素最多的角落，返回这些像素的外框
+    :param grays: 抽样帧（灰度），帧数越多、画面变化越大越准确
+    :param threshold: 亮度阈值（同二值化阈值）
+    :return: 水印区域 [x, y, w, h]，检测不到时返回 None
+    '''
+    if len(grays) < 3:
+        return None  # 帧数太少无法区分静止与运动
+    height, width = grays[0].shape[:2]
+    corner_w, corner_h = int(width * AUTO_CORNER_SIZE[0]), int(height * AUTO_CORNER_SIZE[1])
+    corners = [(0, 0), (width - corner_w, 0), (0, height - corner_h), (width - corner_w, height - corner_h)]
+    join = max(3, height // 90) | 1  # 把同一行文字的笔画连成一片，约为 1080p 下的 13 像素
+
+    best = None
+    for x0, y0 in corners:
+        stack = numpy.stack([gray[y0:y0 + corner_h, x0:x0 + corner_w] for gray in grays])
+        median = numpy.median(stack, axis=0)
+        std = stack.std(axis=0)
+        static = ((median > threshold) & (std < AUTO_STD_THRESHOLD)).astype(numpy.uint8) * 255
+        static = cv2.morphologyEx(static, cv2.MORPH_OPEN, numpy.ones((2, 2), numpy.uint8))  # 去掉零散噪点
+
+        # 连通后取静止像素最多的一片，偶然静止的背景像素不会撑大外框
+        joined = cv2.dilate(static, numpy.ones((join, join), numpy.uint8))
+        count, labels, stats, _ = cv2.connectedComponentsWithStats(joined)
+        for label in range(1, count):
+            pixels = cv2.countNonZero(static[labels == label])
+            if pixels >= MIN_MASK_PIXELS and (best is None or pixels > best[0]):
+                x, y, w, h = stats[label][:4]
+                best = (pixels, x0 + x, y0 + y, w, h)
+
+    if best is None:
+        return None
+    _, x, y, w, h = best
+    x1, y1 = max(x - AUTO_PADDING, 0), max(y - AUTO_PADDING, 0)
+    x2, y2 = min(x + w + AUTO_PADDING, width), min(y + h + AUTO_PADDING, height)
+    return [int(x1), int(y1), int(x2 - x1), int(y2 - y1)]
+
+
+def rois_overlap(a: list, b: list) -> bool:
+    '''
+    两个区域 [x, y, w, h] 是否有重叠部分
+    '''
+    return (min(a[0] + a[2], b[0] + b[2]) > max(a[0], b[0])
+            and min(a[1] + a[3], b[1] + b[3]) > max(a[1], b[1]))
+
+
+# ========== 分段并行处理 ==========
+segment_remover = None
+segment_mask = None
+
+
+@lru_cache(maxsize=16)
+def probe_keyframes(path: str, fps: float) -> list:
+    '''
+    用 ffprobe 读取视频轨的关键帧位置（只读包信息，不解码）
+    :return: 关键帧的帧序号，ffprobe 不可用时返回空列表
+    '''
+    cmd = [FFPROBE_PATH, "-v", "error", "-select_streams", "v:0",
+           "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", path]
+    try:
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, timeout=600)
+    except (OSError, subprocess.TimeoutExpired):
+        return []
+
+    times, keyframe_times = [], []
+    for line in result.stdout.splitlines():
+        fields = line.strip().split(",")
+        if len(fields) < 2 or fields[0] in ("", "N/A"):
+            continue
+        pts = float(fields[0])
+        times.append(pts)
+        if "K" in fields[1]:
+            keyframe_times.append(pts)
+    if not times:
+        return []
+
+    first = min(times)  # 帧序号从第一帧的时间戳算起
+    return sorted({int(round((t - first) * fps)) for t in keyframe_times})
+
+
+def sample_positions(path: str, fps: float, first: int, frame_count: int, sample_count: int) -> list:
+    '''
+    在 [first, frame_count) 中均匀选出 sample_count 个帧序号，MASK_SAMPLE_KEYFRAMES 时对齐到最近的关键帧
+    '''
+    if frame_count <= first + 1:
+        return [first]
+    positions = numpy.linspace(first, frame_count - 1, max(1, sample_count)).round().astype(int).tolist()
+
+    keyframes = [k for k in probe_keyframes(path, fps) if first <= k < frame_count] if MASK_SAMPLE_KEYFRAMES else []
+    if len(keyframes) >= sample_count:
+        positions = [min(keyframes, key=lambda k: abs(k - p)) for p in positions]
+    return sorted(set(positions))
+
+
+def plan_segments(frame_count: int, parts: int, keyframes: list) -> list:
+    '''
+    把 [0, frame_count) 切成 parts 段，分界点尽量移到最近的关键帧上
+    :return: [(起始帧, 结束帧)]，最后一段的结束帧为 None（读到文件末尾）
+    '''
+    bounds = [0]
+    for k in range(1, parts):
+        target = frame_count * k // parts
+        if keyframes:
+            nearest = min(keyframes, key=lambda f: abs(f - target))
+            if abs(nearest - target) <= frame_count // parts // 2:
+                target = nearest  # 离理想分界点不超过半段时对齐关键帧
+        if bounds[-1] < target < frame_count:
+            bounds.append(target)
+
+    ends = bounds[1:] + [None]
+    return list(zip(bounds, ends))
+
+
+def init_segment_worker(threshold: int, kernel_size: int, engine: str, mask: numpy.ndarray):
+    '''
+    子进程初始化：蒙版只传一次，蒙版外框（及填充算子）在每个进程内只计算一次
+    '''
+    global segment_remover, segment_mask
+    segment_remover = WatermarkRemover(threshold, kernel_size, engine)
+    segment_mask = mask
+
+
+def process_segment(name: str, start: int, end, segment_path: str, fps: float, size: tuple) -> int:
+    '''
+    在子进程中处理 [start, end) 帧并编码为一段视频
+    :return: 实际处理的帧数
+    '''
+    video = cv2.VideoCapture(name)
+    if start:
+        video.set(cv2.CAP_PROP_POS_FRAMES, start)
+    encoder = FrameEncoder(segment_path, fps, size)  # 各段只有画面，音轨在拼接时复制
+
+    count = 0
+    try:
+        while end is None or count < end - start:
+            success, frame = video.read()
+            if not success:
+                break
+            encoder.write(segment_remover.inpaint_image(frame, segment_mask))
+            count += 1
+    except OSError:
+        pass
+
+    video.release()
+    if not encoder.close():
+        raise IOError(f"第 {start} 帧起的分段编码失败: {encoder.error}")
+    return count
+
+
+def concat_segments(segment_paths: list, output_path: str, audio_source: str = None) -> bool:
+    '''
+    用 ffmpeg concat 直接拼接各段（-c copy，不重新编码），同时复制 audio_source 的音轨
+    '''
+    list_path = output_path + ".txt"
+    with open(list_path, "w", encoding="utf-8") as f:
+        for path in segment_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+    cmd = [FFMPEG_PATH, "-y", "-f", "concat", "-safe", "0", "-i", list_path]
+    if audio_source:
+        cmd += ["-i", audio_source, "-map", "0:v:0", "-map", "1:a?"]
+    cmd += ["-c", "copy", output_path]
+    try:
+        result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, errors="ignore")
+    except OSError as e:
+        print(f"拼接分段失败: {e}")
+        return False
+    finally:
+        os.remove(list_path)
+
+    if result.returncode != 0:
+        print(f"拼接分段失败: {result.stderr[-500:]}")
+        return False
+    return True
+
+
+
+# ========== 多视频批量处理 ==========
+def estimate_job_memory(name: str) -> int:
+    '''
+    按分辨率估计处理一个视频占用的内存（字节），读不到分辨率时按 1080p 估计
+    '''
+    video = cv2.VideoCapture(name)
+    width, height = int(video.get(cv2.CAP_PROP_FRAME_WIDTH)), int(video.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    video.release()
+    if width <= 0 or height <= 0:
+        width, height = 1920, 1080
+    return JOB_MEMORY_BASE + width * height * 3 * JOB_MEMORY_FRAMES
+
+
+def move_into_place(src: str, dest: str):
+    '''
+    把临时目录中处理完的文件移到 dest：同一文件系统直接改名；跨文件系统（如临时目录在内存盘）时
+    先复制为 dest.part 再改名，OUTPUT_PATH 中不会出现写了一半的视频
+    '''
+    try:
+        os.replace(src, dest)
+    except OSError:
+        part_path = dest + ".part"
+        shutil.copyfile(src, part_path)
+        os.replace(part_path, dest)
+        os.remove(src)
+
+
+def init_batch_worker(threshold: int, kernel_size: int, engine: str):
+    '''
+    批量处理的子进程初始化：每个进程一个 WatermarkRemover，水印区域与 up主信息在进程内复用
+    '''
+    global batch_remover
+    batch_remover = WatermarkRemover(threshold, kernel_size, engine)
+
+
+def process_video(name: str):
+    '''
+    在子进程中处理一个完整视频
+    :return: 失败原因，成功时返回 None
+    '''
+    return batch_remover.remove_watermark_file(name, segments=False)
+
+
 if __name__ == '__main__':
     sel=input('请选择 1：去水印, 2: 去字幕\n')
     if sel=='1':
         remover = WatermarkRemover(threshold=80, kernel_size=5)
 
-        with open(input_file, "r") as file:
-            id_list = file.readlines()
-
-        with open(check_file, "r") as file:
-            c_list = file.readlines()
-            c_set = set(c_list)
+        # 兼容旧版记录文件
+        state = get_store()
+        state.import_legacy(input_file, "merged")
+        state.import_legacy(check_file, "watermark_removed")
 
-        # 过滤掉已经下载过的 BV
-        filtered_list = [bvid for bvid in id_list if bvid not in c_set]
+        # 已下载合并、尚未去水印的 BV
+        id_list = state.done_set("merged")
+        filtered_list = state.pending("watermark_removed")
 
         remover.remove_video_watermark(id_list, filtered_list)
 